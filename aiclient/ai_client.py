@@ -1,31 +1,118 @@
 import json
+import time
+import asyncio
 from openai import AsyncOpenAI
 from . import settings
-from .utils import load_tools
-from .tools import tools_mapping
+from .utils import load_tools, load_system_prompts
+from .tools import tools_mapping, get_accounts_snapshot
+from .transport import get_openai_client
+from .history import HistoryManager, message_to_dict, compact_messages
+from .confirmations import render_confirmation, is_successful, WRITE_TOOLS
+from . import logger
 
 
 tools = load_tools()
+system_prompts = load_system_prompts()
+
+# Cached vs uncached prompt tokens of all completions in the process
+prompt_cache_stats = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0}
+
+
+def prompt_cache_report() -> dict:
+    prompt_tokens = prompt_cache_stats['prompt_tokens']
+    cached_tokens = prompt_cache_stats['cached_tokens']
+    return {
+        **prompt_cache_stats,
+        'uncached_tokens': prompt_tokens - cached_tokens,
+        'cache_hit_ratio': round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.
+    }
 
 
 class Client:
-    def __init__(self, prompt: str, context: dict=None, save_messages: bool=True) -> None:
+    def __init__(
+        self,
+        prompt: str,
+        context: dict=None,
+        save_messages: bool=True,
+        templates: object=None,
+        templated_confirmations: bool=settings.TEMPLATED_CONFIRMATIONS
+    ) -> None:
         self.model = settings.MODEL_NAME
         self.prompt = prompt
         self.tools = tools or []
         self.tool_choice = settings.TOOL_CHOICE
         self.context = context or {}
         self.save_messages = save_messages
-        self.messages = [{
-            "role": "system", 
-            "content": self.prompt.format(**self.context) if len(self.context) else self.prompt
-        }]
+        self.templates = templates
+        self.templated_confirmations = templated_confirmations
+        # The static prompt goes first and is byte-identical for every user and every day,
+        # so together with the tools it forms a prefix that openai can cache.
+        # Per-user and per-date data goes into a small trailing system message.
+        self.messages = [{"role": "system", "content": self.prompt}]
+        # Index of the context message in self.messages, None while the session has no context
+        self.context_message_index = None
+        if len(self.context):
+            self.messages.append({"role": "system", "content": self.render_context()})
+            self.context_message_index = len(self.messages) - 1
+        self.pinned_messages = len(self.messages)
+
+        self.history = HistoryManager(summarizer=self.summarize if settings.HISTORY_SUMMARY_ENABLED else None)
+
+        # Per session: caps the parallel tool calls of one user's turn,
+        # the process-wide limit on database work is the connection pool of core.database
+        self.tool_calls_semaphore = asyncio.Semaphore(settings.TOOL_CALLS_CONCURRENCY)
+        self.last_turn_timings: dict = {}
+        self._turn_usage: dict = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # The HTTP transport is shared by all users, Client holds only conversation state
+        return get_openai_client()
 
-        self.client = AsyncOpenAI(api_key=settings.API_KEY, base_url='https://api.openai.com/v1')
+    def render_context(self) -> str:
+        accounts = self.context.get('accounts') or []
+        accounts_table = '\n'.join(
+            f"        {account['id']} | {account['name']} | {account['currency']} | {account['balance']:.2f}"
+            for account in accounts
+        ) or '        нет счетов'
+        return system_prompts['session_context'].format(**{**self.context, 'accounts': accounts_table})
+
+    async def refresh_accounts(self) -> None:
+        """
+        Loads the user's accounts into the session context, so the model can resolve account_id without a tool call
+        """
+        if 'user' not in self.context:
+            return
+        self.context['accounts'] = await get_accounts_snapshot(user_id=self.context['user'].id)
+        context_message = {"role": "system", "content": self.render_context()}
+        if self.context_message_index is None:
+            # The context becomes the last pinned message, right before the conversation
+            self.context_message_index = self.pinned_messages
+            self.messages.insert(self.context_message_index, context_message)
+            self.pinned_messages += 1
+        else:
+            self.messages[self.context_message_index] = context_message
 
     def add_message(self, content: dict) -> None:
         self.messages.append(content)
 
+    def dump(self) -> dict:
+        return {"messages": compact_messages(self.messages)}
+
+    def restore(self, data: dict) -> None:
+        self.messages = self.messages[:self.pinned_messages] + data["messages"]
+
+    async def summarize(self, text: str, previous_summary: str=None) -> str:
+        content = f"Предыдущее краткое содержание:\n{previous_summary}\n\n" if previous_summary else ''
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompts['history_summarizer']},
+                {"role": "user", "content": content + f"Новые сообщения:\n{text}"}
+            ]
+        )
+        return response.choices[0].message.content or previous_summary or ''
+
     async def get_completion(self) -> str:
         response = await self.client.chat.completions.create(
             model=self.model,
@@ -35,8 +122,21 @@ class Client:
         )
         if not response.choices:
             raise Exception(f"Error: {response.error}")
+        self._record_usage(response.usage)
         return response.choices[0].message
 
+    def _record_usage(self, usage) -> None:
+        if usage is None:
+            return
+        details = usage.prompt_tokens_details
+        cached_tokens = (details.cached_tokens or 0) if details else 0
+        prompt_cache_stats['requests'] += 1
+        prompt_cache_stats['prompt_tokens'] += usage.prompt_tokens
+        prompt_cache_stats['cached_tokens'] += cached_tokens
+        if self._turn_usage is not None:
+            self._turn_usage['prompt_tokens'] += usage.prompt_tokens
+            self._turn_usage['cached_tokens'] += cached_tokens
+
     async def tool_call(self, tool) -> str:
         if tool.type == "function":
             function_name = tool.function.name
@@ -45,33 +145,78 @@ class Client:
                 result = await tools_mapping[function_name](**function_args)
                 return json.dumps(result)
 
+    async def _timed_tool_call(self, tool) -> tuple[str, float]:
+        """
+        Every tool opens its own unit of work, so tools of one response can run concurrently.
+        The session's semaphore caps how many of them run at the same time.
+        """
+        async with self.tool_calls_semaphore:
+            started = time.perf_counter()
+            tool_response = await self.tool_call(tool)
+            return tool_response, time.perf_counter() - started
+
+    def _render_confirmations(self, tool_calls, tool_responses) -> str | None:
+        """
+        Renders the reply locally only if every tool of the response is a successful write tool
+        """
+        confirmations = [
+            render_confirmation(tool.function.name, tool.function.arguments, json.loads(tool_response or 'null'), self.templates)
+            for tool, tool_response in zip(tool_calls, tool_responses)
+        ]
+        if not confirmations or None in confirmations:
+            return None
+        return '\n'.join(confirmations)
+
+    async def _timed_completion(self, timings: dict):
+        started = time.perf_counter()
+        response = await self.get_completion()
+        timings['completions'].append(time.perf_counter() - started)
+        return response
+
     async def chat(self, message: str) -> str:
+        turn_started = time.perf_counter()
+        timings = {'completions': [], 'tools': [], 'total': 0.}
+        self._turn_usage = timings['usage'] = {'prompt_tokens': 0, 'cached_tokens': 0}
         self.add_message({"role": "user", "content": message})
-        response = await self.get_completion()
+        self.messages = await self.history.prune(self.messages)
+        response = await self._timed_completion(timings)
 
-        while response.tool_calls:
-            """
-            Call tools sequentially for each response while there are some
-            """
-            self.add_message(response)
-            for tool in response.tool_calls:
-                """
-                Call tools simultaneously in each response
-                """
-                tool_response = await self.tool_call(tool)
+        confirmation = None
+        while response.tool_calls and confirmation is None:
+            self.add_message(message_to_dict(response))
+            # Tools of one response run concurrently, results are appended in the order of tool_calls
+            results = await asyncio.gather(*[self._timed_tool_call(tool) for tool in response.tool_calls])
+            for tool, (tool_response, elapsed) in zip(response.tool_calls, results):
+                timings['tools'].append({'name': tool.function.name, 'tool_call_id': tool.id, 'elapsed': elapsed})
                 self.add_message({
                     "role": "tool",
                     "tool_call_id": tool.id,
                     "name": tool.function.name,
                     "content": tool_response
                 })
-            response = await self.get_completion()
-        
+            if any(
+                tool.function.name in WRITE_TOOLS | {'update_account'} and is_successful(tool.function.name, json.loads(tool_response or 'null'))
+                for tool, (tool_response, _) in zip(response.tool_calls, results)
+            ):
+                # Balances or account names have changed
+                await self.refresh_accounts()
+            if self.templated_confirmations:
+                # Recorded below as if the assistant had said it, saves one more completion
+                confirmation = self._render_confirmations(response.tool_calls, [tool_response for tool_response, _ in results])
+            if confirmation is None:
+                response = await self._timed_completion(timings)
+
+        timings['templated'] = confirmation is not None
+        content = confirmation or response.content
         result = "No reply! Try again!"
-        if response.content:
-            self.add_message({"role": "assistant", "content": response.content})
-            result = response.content
+        if content:
+            self.add_message({"role": "assistant", "content": content})
+            result = content
         
         if not self.save_messages:
-            self.messages = self.messages[:1]
+            self.messages = self.messages[:self.pinned_messages]
+
+        timings['total'] = time.perf_counter() - turn_started
+        self.last_turn_timings = timings
+        logger.debug(f"Chat turn timings: {timings}")
         return result
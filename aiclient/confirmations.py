@@ -0,0 +1,68 @@
+# This module renders confirmations for successful write tools locally.
+# With templated confirmations on, Client.chat ends the turn with such a message
+# instead of asking openai to turn the tool's JSON into a sentence.
+
+import json
+from typing import Any
+
+
+WRITE_TOOLS = {'create_topup', 'create_withdraw', 'create_purchase', 'create_transfer', 'create_transactions_batch', 'delete_transaction'}
+
+# Fallbacks for templates missing in the provided templates object (tg_messages codes)
+DEFAULT_TEMPLATES = {
+    'confirm_create_topup': 'Записала пополнение: {amount} {currency}{description}, счет {account_name}. Баланс счета: {balance} {account_currency}',
+    'confirm_create_withdraw': 'Записала снятие: {amount} {currency}{description}, счет {account_name}. Баланс счета: {balance} {account_currency}',
+    'confirm_create_purchase': 'Записала покупку: {amount} {currency}{description}, счет {account_name}. Баланс счета: {balance} {account_currency}',
+    'confirm_create_transfer': 'Перевела {amount} {currency} со счета {account_name}{description}. Баланс счета: {balance} {account_currency}',
+    'confirm_create_transactions_batch': 'Записала транзакции ({count}):\n{transactions}\n{balances}',
+    'confirm_delete_transaction': 'Удалила транзакцию #{transaction_id}',
+}
+
+
+def format_amount(value: float) -> str:
+    """
+    Formats numbers as `#0 000,00` and drops zero fraction
+    """
+    return f"{value:,.2f}".replace(',', ' ').replace('.', ',').removesuffix(',00')
+
+
+def is_successful(tool_name: str, result: Any) -> bool:
+    if tool_name == 'delete_transaction':
+        return isinstance(result, dict) and result.get('status') == 'deleted'
+    if tool_name == 'create_transactions_batch':
+        return isinstance(result, list) and bool(result)
+    return isinstance(result, dict) and 'id' in result
+
+
+def render_confirmation(tool_name: str, arguments: str, result: Any, templates: object = None) -> str | None:
+    """
+    Returns None if the tool is not a write tool or it didn't succeed, then the AI has to answer itself
+    """
+    if tool_name not in WRITE_TOOLS or not is_successful(tool_name, result):
+        return None
+    code = f'confirm_{tool_name}'
+    template = getattr(templates, code, None) or DEFAULT_TEMPLATES[code]
+    arguments = json.loads(arguments)
+
+    if tool_name == 'delete_transaction':
+        return template.format(transaction_id=arguments.get('transaction_id'))
+
+    if tool_name == 'create_transactions_batch':
+        lines = []
+        # The last balance of every account, the result is in the order of the transactions
+        balances = {}
+        for item in result:
+            description = f" ({item['description']})" if item['description'] else ''
+            lines.append(f"- {format_amount(abs(item['amount']))} {item['currency']}{description}, счет {item['account_name']}")
+            balances[item['account_id']] = f"Баланс счета {item['account_name']}: {format_amount(item['balance'])} {item['account_currency']}"
+        return template.format(count=len(result), transactions='\n'.join(lines), balances='\n'.join(balances.values()))
+
+    description = (arguments.get('transaction_data') or {}).get('description')
+    return template.format(
+        amount=format_amount(abs(result['amount'])),
+        currency=result['currency'],
+        description=f' ({description})' if description else '',
+        account_name=result['account']['name'],
+        balance=format_amount(result['account']['balance']),
+        account_currency=result['account']['currency']
+    )
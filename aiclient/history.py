@@ -0,0 +1,132 @@
+# This module keeps the conversation sent to openai within a token budget.
+# Leading system messages are pinned, old tool results are compressed first,
+# then the oldest turns are dropped (optionally folded into a rolling summary).
+
+import json
+from typing import Any, Awaitable, Callable, List, Optional
+from . import settings
+
+
+SUMMARY_PREFIX = 'Краткое содержание предыдущего разговора:\n'
+
+Summarizer = Callable[[str, Optional[str]], Awaitable[str]]
+
+
+def message_to_dict(message: Any) -> dict:
+    """
+    Converts openai's ChatCompletionMessage to a plain dict with only the fields the API needs back
+    """
+    if isinstance(message, dict):
+        return message
+    result = {"role": message.role, "content": message.content}
+    if message.tool_calls:
+        result["tool_calls"] = [
+            {
+                "id": tool.id,
+                "type": tool.type,
+                "function": {"name": tool.function.name, "arguments": tool.function.arguments}
+            }
+            for tool in message.tool_calls
+        ]
+    return result
+
+
+def estimate_tokens(message: dict) -> int:
+    return len(json.dumps(message, ensure_ascii=False)) // settings.HISTORY_CHARS_PER_TOKEN + 4
+
+
+def is_summary(message: dict) -> bool:
+    return message.get("role") == "system" and (message.get("content") or '').startswith(SUMMARY_PREFIX)
+
+
+def compact_messages(messages: List[dict]) -> List[dict]:
+    """
+    Compact form of a conversation for storing idle sessions:
+    pinned system messages, tool calls and tool payloads are stripped, only the summary and plain dialogue remain
+    """
+    _, summary, turns = HistoryManager._split(messages)
+    dialogue = [
+        {"role": message["role"], "content": message["content"]}
+        for turn in turns for message in turn
+        if message.get("role") in ("user", "assistant") and message.get("content") and not message.get("tool_calls")
+    ]
+    return ([summary] if summary else []) + dialogue
+
+
+class HistoryManager:
+    def __init__(
+        self,
+        max_tokens: int = settings.HISTORY_MAX_TOKENS,
+        tool_result_max_chars: int = settings.HISTORY_TOOL_RESULT_MAX_CHARS,
+        keep_last_turns: int = settings.HISTORY_KEEP_LAST_TURNS,
+        summarizer: Summarizer = None
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.tool_result_max_chars = tool_result_max_chars
+        self.keep_last_turns = max(keep_last_turns, 1)
+        self.summarizer = summarizer
+
+    @staticmethod
+    def _split(messages: List[dict]) -> tuple[List[dict], Optional[dict], List[List[dict]]]:
+        """
+        Splits messages into pinned system messages, rolling summary and turns.
+        Every turn starts with a user message, so tool calls are never separated from their results.
+        """
+        pinned, summary, turns = [], None, []
+        for message in messages:
+            if is_summary(message):
+                summary = message
+            elif message.get("role") == "system" and not turns:
+                pinned.append(message)
+            elif message.get("role") == "user" or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return pinned, summary, turns
+
+    def _compress_tool_results(self, turn: List[dict]) -> List[dict]:
+        compressed = []
+        for message in turn:
+            content = message.get("content") or ''
+            if message.get("role") == "tool" and len(content) > self.tool_result_max_chars:
+                message = {**message, "content": content[:self.tool_result_max_chars] + '... [truncated]'}
+            compressed.append(message)
+        return compressed
+
+    @staticmethod
+    def _tokens(messages: List[dict]) -> int:
+        return sum(estimate_tokens(message) for message in messages)
+
+    @staticmethod
+    def _render_turns(turns: List[List[dict]]) -> str:
+        lines = []
+        for turn in turns:
+            for message in turn:
+                if message.get("role") in ("user", "assistant") and message.get("content"):
+                    lines.append(f"{message['role']}: {message['content']}")
+        return '\n'.join(lines)
+
+    async def prune(self, messages: List[dict]) -> List[dict]:
+        pinned, summary, turns = self._split(messages)
+        summary_messages = [summary] if summary else []
+        if self._tokens(messages) <= self.max_tokens:
+            return messages
+
+        # Old tool results are the largest and least useful part of the history
+        old, recent = turns[:-self.keep_last_turns], turns[-self.keep_last_turns:]
+        turns = [self._compress_tool_results(turn) for turn in old] + recent
+
+        dropped = []
+        total = self._tokens(pinned + summary_messages) + sum(self._tokens(turn) for turn in turns)
+        # The last keep_last_turns turns stay even if the budget is still exceeded
+        while total > self.max_tokens and len(turns) > self.keep_last_turns:
+            turn = turns.pop(0)
+            dropped.append(turn)
+            total -= self._tokens(turn)
+
+        if dropped and self.summarizer:
+            previous = summary["content"][len(SUMMARY_PREFIX):] if summary else None
+            text = await self.summarizer(self._render_turns(dropped), previous)
+            summary_messages = [{"role": "system", "content": SUMMARY_PREFIX + text}]
+
+        return pinned + summary_messages + [message for turn in turns for message in turn]
@@ -0,0 +1,117 @@
+# This module keeps AI sessions of active users in memory and evicts idle ones.
+# Evicted conversations are stored in a compact form and restored on the user's next message.
+# Sessions in the middle of a turn are never evicted, so the registry may hold more than max_active for a while.
+
+import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Hashable
+from .ai_client import Client
+from . import settings
+from . import logger
+
+
+class SessionRegistry:
+    def __init__(
+        self,
+        max_active: int = settings.SESSIONS_MAX_ACTIVE,
+        idle_ttl: float = settings.SESSIONS_IDLE_TTL,
+        max_dormant: int = settings.SESSIONS_MAX_DORMANT
+    ) -> None:
+        self.max_active = max_active
+        self.idle_ttl = idle_ttl
+        self.max_dormant = max_dormant
+        # Both dicts are ordered from the least to the most recently used session
+        self._active: OrderedDict[Hashable, tuple[Client, float]] = OrderedDict()
+        self._dormant: OrderedDict[Hashable, str] = OrderedDict()
+        # Number of turns running on each session
+        self._in_use: Dict[Hashable, int] = {}
+        self.stats = {'created': 0, 'evicted': 0, 'restored': 0, 'dropped': 0}
+
+    def get(self, key: Hashable, factory: Callable[[], Client]) -> Client:
+        """
+        Returns the user's session, restoring it from the compact storage or creating a new one
+        """
+        self.evict_idle()
+        if key in self._active:
+            client, _ = self._active.pop(key)
+        else:
+            client = factory()
+            dormant = self._dormant.pop(key, None)
+            if dormant is not None:
+                client.restore(json.loads(dormant))
+                self.stats['restored'] += 1
+            else:
+                self.stats['created'] += 1
+        self._active[key] = (client, time.monotonic())
+        self._evict_overflow()
+        return client
+
+    @asynccontextmanager
+    async def session(self, key: Hashable, factory: Callable[[], Client]) -> AsyncIterator[Client]:
+        """
+        Same as get, and keeps the session from being evicted until the turn is over
+        """
+        self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            yield self.get(key, factory)
+        finally:
+            self._in_use[key] -= 1
+            if not self._in_use[key]:
+                del self._in_use[key]
+
+    def peek(self, key: Hashable) -> Client | None:
+        """
+        Returns an active session without touching its idle timer
+        """
+        if key in self._active:
+            return self._active[key][0]
+        return None
+
+    def _evict(self, key: Hashable) -> None:
+        client, _ = self._active.pop(key)
+        self._dormant[key] = json.dumps(client.dump(), ensure_ascii=False, separators=(',', ':'))
+        self.stats['evicted'] += 1
+        while len(self._dormant) > self.max_dormant:
+            self._dormant.popitem(last=False)
+            self.stats['dropped'] += 1
+
+    def _evict_overflow(self) -> None:
+        # The most recently used session is the one just handed out
+        idle = [key for key in list(self._active)[:-1] if key not in self._in_use]
+        for key in idle[:len(self._active) - self.max_active]:
+            self._evict(key)
+
+    def evict_idle(self) -> None:
+        deadline = time.monotonic() - self.idle_ttl
+        for key, (_, last_used) in list(self._active.items()):
+            if last_used > deadline:
+                break
+            if key not in self._in_use:
+                self._evict(key)
+
+    @staticmethod
+    def _session_size(client: Client) -> int:
+        return len(json.dumps(client.messages, ensure_ascii=False, default=str).encode())
+
+    def report(self) -> Dict:
+        """
+        Approximate memory per session in bytes (serialized conversation size) and eviction counters
+        """
+        active = {key: self._session_size(client) for key, (client, _) in self._active.items()}
+        dormant = {key: len(data.encode()) for key, data in self._dormant.items()}
+        report = {
+            **self.stats,
+            'active': len(active),
+            'dormant': len(dormant),
+            'in_use': len(self._in_use),
+            'active_bytes': sum(active.values()),
+            'dormant_bytes': sum(dormant.values()),
+            'sessions': {
+                **{key: {'state': 'dormant', 'bytes': size} for key, size in dormant.items()},
+                **{key: {'state': 'active', 'bytes': size} for key, size in active.items()}
+            }
+        }
+        logger.info(f"AI sessions: {self.stats}, active={len(active)}, dormant={len(dormant)}")
+        return report
@@ -9,4 +9,33 @@ USER_PROMPT_FILENAME = 'aiclient/prompt.txt'
 SYSTEM_PROMPT_DIRECTORY = 'aiclient/system_prompts'
 API_KEY = os.getenv('OPENAI_API_KEY')
 MODEL_NAME = 'gpt-4o-mini'
-TOOL_CHOICE = 'auto'
\ No newline at end of file
+TOOL_CHOICE = 'auto'
+# Parallel tool calls within one user's turn, not across users
+TOOL_CALLS_CONCURRENCY = int(os.getenv('AI_TOOL_CALLS_CONCURRENCY', 4))
+# End the turn with a locally rendered message after successful write tools, see aiclient.confirmations
+TEMPLATED_CONFIRMATIONS = os.getenv('AI_TEMPLATED_CONFIRMATIONS', 'false').lower() == 'true'
+
+# Conversation history budget, see aiclient.history
+HISTORY_MAX_TOKENS = int(os.getenv('AI_HISTORY_MAX_TOKENS', 8000))
+HISTORY_TOOL_RESULT_MAX_CHARS = int(os.getenv('AI_HISTORY_TOOL_RESULT_MAX_CHARS', 400))
+HISTORY_KEEP_LAST_TURNS = int(os.getenv('AI_HISTORY_KEEP_LAST_TURNS', 2))
+HISTORY_CHARS_PER_TOKEN = int(os.getenv('AI_HISTORY_CHARS_PER_TOKEN', 3))
+HISTORY_SUMMARY_ENABLED = os.getenv('AI_HISTORY_SUMMARY_ENABLED', 'false').lower() == 'true'
+
+# Idle sessions eviction, see aiclient.sessions
+SESSIONS_MAX_ACTIVE = int(os.getenv('AI_SESSIONS_MAX_ACTIVE', 1000))
+SESSIONS_IDLE_TTL = float(os.getenv('AI_SESSIONS_IDLE_TTL', 30 * 60))
+SESSIONS_MAX_DORMANT = int(os.getenv('AI_SESSIONS_MAX_DORMANT', 50000))
+
+# Messages sent within this window are merged into one AI turn, see tg_bot.inbox
+DEBOUNCE_SECONDS = float(os.getenv('AI_DEBOUNCE_SECONDS', 1.5))
+
+# Shared OpenAI transport, see aiclient.transport
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+OPENAI_HTTP2 = os.getenv('OPENAI_HTTP2', 'true').lower() == 'true'
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 100))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 60))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 60))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))
@@ -1,21 +1,27 @@
 # This module contains openai's tools mapping and wrapper functions for the tools.
 # Wrapper functions handle exceptions from the budget app and produce results for the openai's client
 
+from pydantic import ValidationError
 from core.uow import UnitOfWork
 from core.schemas import Filter
 from core.database import Session
-from budget.repositories import AccountRepository, TransactionRepository
+from budget.repositories import AccountRepository, TransactionRepository, FxRateRepository, RollupRepository, TransactionArchiveRepository
 from budget.services import AccountService, TransactionService, CurrencyService
 from budget.schemas import (
     AccountUpdateSchema,
     TransactionCreateInputSchema,
     TransactionPurchaseCreateInputSchema,
-    TransactionTransferCreateInputSchema
+    TransactionTransferCreateInputSchema,
+    TransactionBatchCreateInputSchema
 )
+from core.exceptions import InvalidCursor, FilterFieldNotAllowed, FilterOperationNotAllowed
 from budget.exceptions import (
     AccountNotFound,
     AccountAlreadyExists,
     TransactionNotFound,
+    InvalidTransaction,
+    RatesUnavailable,
+    CurrencyRateNotFound,
 )
 from . import logger
 from tg_bot.utils import notify_admin
@@ -23,7 +29,10 @@ from tg_bot.utils import notify_admin
 
 uow = UnitOfWork(session=Session, repositories={
     'accounts': AccountRepository,
-    'transactions': TransactionRepository
+    'transactions': TransactionRepository,
+    'fx_rates': FxRateRepository,
+    'rollups': RollupRepository,
+    'archive': TransactionArchiveRepository
 })
 
 
@@ -41,21 +50,48 @@ async def get_account(**kwargs) -> dict:
             return {"status": "Some error occurred. The team is already looking into it."}
 
 
-async def list_accounts(**kwargs) -> list:
+async def list_accounts(**kwargs) -> list | dict:
     filters = kwargs.pop('filters', None)
     if filters:
         filters = Filter.model_validate(filters)
     async with uow:
         service = AccountService(uow)
         try:
-            accounts = await service.list_accounts(filters=filters, **kwargs)
-            return [account.model_dump() for account in accounts]
+            # Offset is kept as a fallback, cursor pages are stable and don't slow down.
+            # offset=0 is the first page and goes the cursor way, so it returns next_cursor
+            offset = kwargs.pop('offset', None) or 0
+            if offset > 0 and not kwargs.get('cursor'):
+                kwargs.pop('cursor', None)
+                accounts = await service.list_accounts(filters=filters, offset=offset, **kwargs)
+                return [account.model_dump() for account in accounts]
+            page = await service.list_accounts_page(filters=filters, **kwargs)
+            return page.model_dump()
+        except InvalidCursor:
+            return {"status": "Invalid cursor, start from the first page"}
         except Exception as e:
             logger.error(str(e))
             await notify_admin(str(e))
             return {"status": "Some error occurred. The team is already looking into it."}        
 
 
+async def get_accounts_snapshot(user_id: int) -> list:
+    """
+    Compact list of the user's active accounts for the session context, not a tool for openai
+    """
+    async with uow:
+        service = AccountService(uow)
+        accounts = await service.list_accounts(
+            user_id=user_id,
+            # 'true' compiles to IS 1 which T-SQL rejects, bit columns are compared with =
+            filters=Filter.model_validate([{'field': 'is_active', 'op': '=', 'value': True}]),
+            limit=50
+        )
+        return [
+            {'id': account.id, 'name': account.name, 'currency': account.currency, 'balance': account.balance}
+            for account in accounts
+        ]
+
+
 async def update_account(**kwargs) -> dict:
     async with uow:
         service = AccountService(uow)
@@ -80,6 +116,8 @@ async def get_user_balance(**kwargs) -> float:
         service = AccountService(uow)
         try:
             return await service.get_user_balance(**kwargs)
+        except CurrencyRateNotFound as e:
+            return {"status": f"No exchange rate for {e}"}
         except Exception as e:
             logger.error(str(e))
             await notify_admin(str(e))
@@ -100,15 +138,55 @@ async def get_transaction(**kwargs) -> dict:
             return {"status": "Some error occurred. The team is already looking into it."}
 
 
-async def list_transactions(**kwargs) -> list:
+async def list_transactions(**kwargs) -> list | dict:
+    filters = kwargs.pop('filters', None)
+    if filters:
+        filters = Filter.model_validate(filters)
+    async with uow:
+        service = TransactionService(uow)
+        try:
+            offset = kwargs.pop('offset', None) or 0
+            if offset > 0 and not kwargs.get('cursor'):
+                kwargs.pop('cursor', None)
+                transactions = await service.list_transactions(filters=filters, offset=offset, **kwargs)
+                return [transaction.model_dump() for transaction in transactions]
+            page = await service.list_transactions_page(filters=filters, **kwargs)
+            return page.model_dump()
+        except InvalidCursor:
+            return {"status": "Invalid cursor, start from the first page"}
+        except Exception as e:
+            logger.error(str(e))
+            await notify_admin(str(e))
+            return {"status": "Some error occurred. The team is already looking into it."}
+
+
+async def list_deleted_transactions(**kwargs) -> list | dict:
     filters = kwargs.pop('filters', None)
     if filters:
         filters = Filter.model_validate(filters)
     async with uow:
         service = TransactionService(uow)
         try:
-            transactions = await service.list_transactions(filters=filters, **kwargs)
+            transactions = await service.list_deleted_transactions(filters=filters, **kwargs)
             return [transaction.model_dump() for transaction in transactions]
+        except (FilterFieldNotAllowed, FilterOperationNotAllowed) as e:
+            return {"status": str(e)}
+        except Exception as e:
+            logger.error(str(e))
+            await notify_admin(str(e))
+            return {"status": "Some error occurred. The team is already looking into it."}
+
+
+async def summarize_transactions(**kwargs) -> list:
+    filters = kwargs.pop('filters', None)
+    if filters:
+        filters = Filter.model_validate(filters)
+    async with uow:
+        service = TransactionService(uow)
+        try:
+            return await service.summarize_transactions(filters=filters, **kwargs)
+        except (FilterFieldNotAllowed, FilterOperationNotAllowed) as e:
+            return {"status": str(e)}
         except Exception as e:
             logger.error(str(e))
             await notify_admin(str(e))
@@ -183,12 +261,44 @@ async def create_transfer(**kwargs) -> dict:
             return {"status": "Some error occurred. The team is already looking into it."}
 
 
+async def create_transactions_batch(**kwargs) -> list | dict:
+    async with uow:
+        service = TransactionService(uow)
+        try:
+            transaction_data = TransactionBatchCreateInputSchema(**kwargs['transaction_data'])
+            transactions = await service.create_transactions_batch(transaction_data=transaction_data)
+            await uow.commit()
+            return [
+                {
+                    'id': transaction.id,
+                    'type': transaction.type.type_name,
+                    'amount': transaction.amount,
+                    'currency': transaction.currency,
+                    'description': entry.description,
+                    'account_id': transaction.account.id,
+                    'account_name': transaction.account.name,
+                    'balance': transaction.account.balance,
+                    'account_currency': transaction.account.currency
+                }
+                for transaction, entry in zip(transactions, transaction_data.transactions)
+            ]
+        except AccountNotFound:
+            return {"status": "No account found"}
+        except (ValidationError, InvalidTransaction) as e:
+            return {"status": f"Nothing is recorded, invalid transactions: {e}"}
+        except Exception as e:
+            logger.error(str(e))
+            await notify_admin(str(e))
+            return {"status": "Some error occurred. The team is already looking into it."}
+
+
 async def delete_transaction(**kwargs) -> dict:
     async with uow:
         service = TransactionService(uow)
         try:
             await service.delete_transaction(**kwargs)
             await uow.commit()
+            return {"status": "deleted"}
         except TransactionNotFound:
             return {"status": "Transaction not found"}
         except Exception as e:
@@ -202,6 +312,8 @@ async def get_currency_rate(**kwargs) -> float:
         service = CurrencyService(uow)
         try:
             return await service.get_currency_rate(**kwargs)
+        except RatesUnavailable:
+            return {"status": "Exchange rates are temporarily unavailable"}
         except Exception as e:
             logger.error(str(e))
             await notify_admin(str(e))
@@ -215,10 +327,13 @@ tools_mapping = {
     "get_user_balance": get_user_balance,
     "get_transaction": get_transaction,
     "list_transactions": list_transactions,
+    "list_deleted_transactions": list_deleted_transactions,
+    "summarize_transactions": summarize_transactions,
     "create_topup": create_topup,
     "create_withdraw": create_withdraw,
     "create_purchase": create_purchase,
     "create_transfer": create_transfer,
+    "create_transactions_batch": create_transactions_batch,
     "delete_transaction": delete_transaction,
     "get_currency_rate": get_currency_rate
 }
\ No newline at end of file
@@ -0,0 +1,52 @@
+# This module keeps one process-wide AsyncOpenAI client.
+# All per-user Client objects share its HTTP connection pool instead of opening their own.
+
+import importlib.util
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from . import settings
+from . import logger
+
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+_client: AsyncOpenAI | None = None
+
+
+def get_openai_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        http_client = DefaultAsyncHttpxClient(
+            http2=settings.OPENAI_HTTP2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT)
+        )
+        _client = AsyncOpenAI(
+            api_key=settings.API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=http_client,
+            max_retries=settings.OPENAI_MAX_RETRIES
+        )
+    return _client
+
+
+async def warm_up() -> None:
+    """
+    Opens the first connection (DNS, TCP and TLS handshakes) at application start
+    so the first user's message doesn't pay for it
+    """
+    try:
+        await get_openai_client().models.retrieve(settings.MODEL_NAME)
+    except Exception as e:
+        logger.error(f"OpenAI warm-up failed: {e}")
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
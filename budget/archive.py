@@ -0,0 +1,80 @@
+# This module moves soft-deleted transactions out of the transactions table into transactions_archive.
+# Rows deleted more than TRANSACTIONS_RETENTION_DAYS ago are moved in batches of TRANSACTIONS_ARCHIVE_BATCH_SIZE,
+# each batch in its own short transaction, so the archiver never holds locks on the ledger for long.
+
+import os
+import asyncio
+import datetime
+import logging
+from budget.uow import UnitOfWork
+from budget.services import TransactionService
+
+
+TRANSACTIONS_RETENTION_DAYS = int(os.getenv('TRANSACTIONS_RETENTION_DAYS', 90))
+# Ids of a batch are sent as parameters, MSSQL accepts up to 2100 of them, transfers may double the batch
+TRANSACTIONS_ARCHIVE_BATCH_SIZE = int(os.getenv('TRANSACTIONS_ARCHIVE_BATCH_SIZE', 500))
+TRANSACTIONS_ARCHIVE_INTERVAL = float(os.getenv('TRANSACTIONS_ARCHIVE_INTERVAL', 24 * 3600))
+
+logger = logging.getLogger('TransactionArchiver')
+
+
+class TransactionArchiver:
+    """
+    The uow needs `transactions` and `archive` repositories
+    """
+    def __init__(
+        self,
+        uow: UnitOfWork,
+        retention_days: int = TRANSACTIONS_RETENTION_DAYS,
+        batch_size: int = TRANSACTIONS_ARCHIVE_BATCH_SIZE,
+        interval: float = TRANSACTIONS_ARCHIVE_INTERVAL,
+        pause: float = 0.1
+    ) -> None:
+        self.uow = uow
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.interval = interval
+        # Between batches, lets other writers take the locks
+        self.pause = pause
+        self._task: asyncio.Task | None = None
+
+    async def archive(self) -> int:
+        """
+        Archives everything past the retention period, returns the number of moved rows
+        """
+        deleted_before = datetime.datetime.now() - datetime.timedelta(days=self.retention_days)
+        total = 0
+        while True:
+            async with self.uow:
+                moved = await TransactionService(self.uow).archive_deleted_transactions(
+                    deleted_before=deleted_before,
+                    batch_size=self.batch_size
+                )
+                await self.uow.commit()
+            if not moved:
+                return total
+            total += moved
+            await asyncio.sleep(self.pause)
+
+    async def _archive_forever(self) -> None:
+        while True:
+            try:
+                moved = await self.archive()
+                if moved:
+                    logger.info(f'Archived {moved} deleted transactions')
+            except Exception as e:
+                logger.error(f'Archiving failed: {e!r}')
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._archive_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
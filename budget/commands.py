@@ -0,0 +1,71 @@
+# Maintenance commands for the budget database.
+# Usage:
+#     python -m budget.commands rebuild-rollups [--account-id 1 --account-id 2]
+#     python -m budget.commands check-rollups [--account-id 1]
+#     python -m budget.commands archive-transactions [--retention-days 90] [--batch-size 500]
+
+import sys
+import json
+import asyncio
+import argparse
+from core.database import Session
+from budget.uow import UnitOfWork
+from budget.repositories import TransactionRepository, TransactionArchiveRepository, RollupRepository
+from budget.services import RollupService
+from budget.archive import TransactionArchiver, TRANSACTIONS_RETENTION_DAYS, TRANSACTIONS_ARCHIVE_BATCH_SIZE
+
+
+uow = UnitOfWork(Session, repositories={
+    'transactions': TransactionRepository,
+    'archive': TransactionArchiveRepository,
+    'rollups': RollupRepository
+})
+
+
+async def rebuild_rollups(account_ids: list[int] | None) -> int:
+    async with uow:
+        rows = await RollupService(uow).rebuild(account_ids=account_ids)
+        await uow.commit()
+    print(f'Rollups rebuilt: {rows} rows')
+    return 0
+
+
+async def check_rollups(account_ids: list[int] | None) -> int:
+    async with uow:
+        mismatches = await RollupService(uow).check(account_ids=account_ids)
+    for mismatch in mismatches:
+        print(json.dumps(mismatch, default=str))
+    print(f'Mismatching rollups: {len(mismatches)}')
+    return 1 if mismatches else 0
+
+
+async def archive_transactions(retention_days: int, batch_size: int) -> int:
+    moved = await TransactionArchiver(uow, retention_days=retention_days, batch_size=batch_size).archive()
+    print(f'Transactions archived: {moved}')
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Budget maintenance commands')
+    parser.add_argument('command', choices=['rebuild-rollups', 'check-rollups', 'archive-transactions'])
+    parser.add_argument('--account-id', dest='account_ids', type=int, action='append', help='Limit to the account, can be repeated')
+    parser.add_argument('--retention-days', type=int, default=TRANSACTIONS_RETENTION_DAYS, help='Archive transactions deleted earlier')
+    parser.add_argument('--batch-size', type=int, default=TRANSACTIONS_ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    commands = {
+        'rebuild-rollups': lambda: rebuild_rollups(args.account_ids),
+        'check-rollups': lambda: check_rollups(args.account_ids),
+        'archive-transactions': lambda: archive_transactions(args.retention_days, args.batch_size)
+    }
+
+    async def run() -> int:
+        try:
+            return await commands[args.command]()
+        finally:
+            await Session.kw['bind'].dispose()
+
+    return asyncio.run(run())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# This module converts whole columns of amounts between currencies with numpy.
+# Rates are looked up "as of" each row's date: the latest stored rate on or before the date.
+
+import datetime
+from typing import Iterable, Sequence, Tuple
+import numpy as np
+from budget.exceptions import CurrencyRateNotFound
+
+
+# Rates are stored in KZT, so KZT itself never needs a rate
+RATES_BASE_CURRENCY = 'KZT'
+
+# Separates currencies in the combined (currency, day) search key
+_DAYS_PER_CURRENCY = 10 ** 6
+
+
+class RateTable:
+    """
+    Built from (currency, date, rate) rows, the rate is how many KZT one unit of the currency costs.
+    All rows are kept in one sorted array of (currency, day) keys, so a lookup for any number of rows is a single searchsorted.
+    """
+    def __init__(self, rows: Iterable[Tuple[str, datetime.date, float]]) -> None:
+        rows = list(rows)
+        self.currencies = {currency: i for i, currency in enumerate(sorted({row[0] for row in rows}))}
+        keys = np.array([self._key(self.currencies[c], d) for c, d, _ in rows], dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.rates = np.array([rate for _, _, rate in rows], dtype=np.float64)[order]
+
+    @staticmethod
+    def _key(currency_index, day):
+        if isinstance(day, datetime.date):
+            day = day.toordinal()
+        return currency_index * _DAYS_PER_CURRENCY + day
+
+    def to_base(self, currencies: Sequence[str], dates: Sequence[datetime.date]) -> np.ndarray:
+        """
+        KZT rate of every row as of its date
+        """
+        currencies = np.asarray(currencies, dtype=object)
+        days = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(currencies))
+        result = np.ones(len(currencies), dtype=np.float64)
+        needs_rate = currencies != RATES_BASE_CURRENCY
+        if not needs_rate.any():
+            return result
+
+        missing = sorted({c for c in currencies[needs_rate] if c not in self.currencies})
+        if missing:
+            raise CurrencyRateNotFound(', '.join(missing))
+        indexes = np.fromiter((self.currencies[c] for c in currencies[needs_rate]), dtype=np.int64)
+        keys = self._key(indexes, days[needs_rate])
+        positions = np.searchsorted(self.keys, keys, side='right') - 1
+        # The found rate must belong to the same currency, otherwise there's no rate on or before the date
+        found = (positions >= 0) & (self.keys[np.maximum(positions, 0)] // _DAYS_PER_CURRENCY == indexes)
+        if not found.all():
+            raise CurrencyRateNotFound(', '.join(sorted(set(currencies[needs_rate][~found]))))
+        result[needs_rate] = self.rates[positions]
+        return result
+
+    def convert(
+        self,
+        amounts: Sequence[float],
+        currencies: Sequence[str],
+        dates: Sequence[datetime.date],
+        base_currency: str
+    ) -> np.ndarray:
+        amounts = np.asarray(amounts, dtype=np.float64)
+        in_kzt = amounts * self.to_base(currencies, dates)
+        return in_kzt / self.to_base([base_currency] * len(amounts), dates)
@@ -0,0 +1,82 @@
+# This module resolves free text like "доллар", "$", "tenge" or "Казахстанский тенге" into a currency.
+# Lookups go from the cheapest to the most expensive: ISO code, alias table,
+# then fuzzy scoring limited to candidates that share trigrams with the query.
+
+from collections import Counter
+from typing import Dict, List, Set
+from thefuzz import process, fuzz, utils
+from budget.schemas import CurrencyReadSchema
+
+
+CURRENCY_ALIASES = {
+    '$': 'USD', 'usd': 'USD', 'dollar': 'USD', 'dollars': 'USD', 'бакс': 'USD', 'баксов': 'USD', 'бакса': 'USD',
+    'доллар': 'USD', 'доллара': 'USD', 'долларов': 'USD', 'усд': 'USD',
+    '€': 'EUR', 'eur': 'EUR', 'euro': 'EUR', 'euros': 'EUR', 'евро': 'EUR',
+    '₸': 'KZT', 'kzt': 'KZT', 'tenge': 'KZT', 'тг': 'KZT', 'тенге': 'KZT', 'кзт': 'KZT',
+    '₽': 'RUB', 'rub': 'RUB', 'руб': 'RUB', 'рубль': 'RUB', 'рубля': 'RUB', 'рублей': 'RUB',
+}
+
+# The same threshold find_currency always used
+MATCH_THRESHOLD = 50
+MAX_CANDIDATES = 8
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.lower().replace('ё', 'е').split()).strip(' .,!')
+
+
+def trigrams(text: str) -> Set[str]:
+    result = set()
+    for token in utils.full_process(text).split():
+        token = f' {token} '
+        result.update(token[i:i + 3] for i in range(len(token) - 2))
+    return result
+
+
+class CurrencyResolver:
+    """
+    Built once from the currencies table, resolve() doesn't touch the database
+    """
+    def __init__(
+        self,
+        currencies: List[CurrencyReadSchema],
+        aliases: Dict[str, str] = CURRENCY_ALIASES,
+        threshold: int = MATCH_THRESHOLD,
+        max_candidates: int = MAX_CANDIDATES
+    ) -> None:
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.by_iso_code = {currency.iso_code.upper(): currency for currency in currencies}
+        self.aliases = {
+            normalize(alias): iso_code
+            for alias, iso_code in aliases.items() if iso_code in self.by_iso_code
+        }
+        # Same choices the fuzzy search always scored: "ISO:NAME"
+        self.choices = {
+            f'{currency.iso_code.upper()}:{currency.name.upper()}': currency
+            for currency in currencies
+        }
+        self.index: Dict[str, List[str]] = {}
+        for choice in self.choices:
+            for gram in trigrams(choice):
+                self.index.setdefault(gram, []).append(choice)
+
+    def _candidates(self, query: str) -> List[str]:
+        counts = Counter(choice for gram in trigrams(query) for choice in self.index.get(gram, ()))
+        return [choice for choice, _ in counts.most_common(self.max_candidates)]
+
+    def resolve(self, name: str) -> CurrencyReadSchema | None:
+        query = normalize(name)
+        if not query or not self.choices:
+            return None
+        if query.upper() in self.by_iso_code:
+            return self.by_iso_code[query.upper()]
+        if query in self.aliases:
+            return self.by_iso_code[self.aliases[query]]
+
+        # Queries without common trigrams (too short or misspelled) are scored against every currency
+        choices = self._candidates(query) or list(self.choices)
+        match = process.extractOne(query.upper(), choices, scorer=fuzz.partial_token_sort_ratio)
+        if match is None or match[1] <= self.threshold:
+            return None
+        return self.choices[match[0]]
@@ -20,3 +20,15 @@ class CurrencyNotFound(Exception):
 
 class TransactionNotFound(Exception):
     ...
+
+
+class InvalidTransaction(Exception):
+    ...
+
+
+class RatesUnavailable(Exception):
+    ...
+
+
+class CurrencyRateNotFound(Exception):
+    ...
@@ -0,0 +1,138 @@
+# This module provides exchange rates from the nationalbank.kz feed.
+# The parsed rate table is cached for FX_RATES_TTL seconds, concurrent callers share a single download,
+# a background task keeps the table fresh and the last good table is served if the feed is unavailable.
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List
+import httpx
+from bs4 import BeautifulSoup
+from budget.exceptions import RatesUnavailable
+
+
+FX_RATES_URL = os.getenv('FX_RATES_URL', 'https://nationalbank.kz/rss/rates_all.xml')
+FX_RATES_TTL = float(os.getenv('FX_RATES_TTL', 3600))
+FX_RATES_TIMEOUT = float(os.getenv('FX_RATES_TIMEOUT', 10))
+
+logger = logging.getLogger('FxRates')
+
+# Called with every freshly downloaded table, e.g. to persist it
+RatesListener = Callable[[Dict[str, float]], Awaitable[None]]
+
+
+def parse_rates(xml: str) -> Dict[str, float]:
+    """
+    Rates in KZT for one unit of each currency, KZT itself is 1
+    """
+    soup = BeautifulSoup(xml, 'xml')
+    rates = {'KZT': 1.}
+    for item in soup.find_all('item'):
+        rates[item.find('title').text.strip()] = float(item.find('description').text.strip()) / int(item.find('quant').text.strip())
+    return rates
+
+
+class RateProvider:
+    def __init__(self, url: str = FX_RATES_URL, ttl: float = FX_RATES_TTL, timeout: float = FX_RATES_TIMEOUT) -> None:
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.listeners: List[RatesListener] = []
+        self._rates: Dict[str, float] | None = None
+        self._fetched_at = 0.
+        self._inflight: asyncio.Task | None = None
+        self._refresher: asyncio.Task | None = None
+        self._client: httpx.AsyncClient | None = None
+        self.stats = {'hits': 0, 'downloads': 0, 'failures': 0, 'stale': 0}
+
+    def add_listener(self, listener: RatesListener) -> None:
+        self.listeners.append(listener)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._rates is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def _download(self) -> Dict[str, float]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        response = await self._client.get(self.url)
+        response.raise_for_status()
+        rates = parse_rates(response.text)
+        self._rates, self._fetched_at = rates, time.monotonic()
+        self.stats['downloads'] += 1
+        for listener in self.listeners:
+            try:
+                await listener(rates)
+            except Exception as e:
+                logger.error(f'Rates listener failed: {e}')
+        return rates
+
+    async def refresh(self) -> Dict[str, float]:
+        """
+        Downloads the table, callers arriving while a download is running wait for the same download.
+        Falls back to the last good table if the download fails.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._download())
+            self._inflight.add_done_callback(self._clear_inflight)
+        try:
+            # Shielded so a cancelled caller doesn't cancel the download for the others
+            return await asyncio.shield(self._inflight)
+        except Exception as e:
+            self.stats['failures'] += 1
+            if self._rates is None:
+                raise RatesUnavailable from e
+            logger.error(f'Serving last known rates, download failed: {e!r}')
+            self.stats['stale'] += 1
+            return self._rates
+
+    def _clear_inflight(self, task: asyncio.Task) -> None:
+        if self._inflight is task:
+            self._inflight = None
+        if not task.cancelled():
+            # Retrieved here, so a failure nobody awaited isn't reported as never retrieved
+            task.exception()
+
+    async def get_rates(self) -> Dict[str, float]:
+        if self.is_fresh:
+            self.stats['hits'] += 1
+            return self._rates
+        return await self.refresh()
+
+    async def get_rate(self, first: str, second: str) -> float:
+        """
+        How many `second` one `first` costs
+        """
+        rates = await self.get_rates()
+        return round(rates.get(first, 1.) / rates.get(second, 1.), 2)
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except RatesUnavailable:
+                pass
+            await asyncio.sleep(self.ttl)
+
+    def start(self) -> None:
+        """
+        Starts the background refresher, so requests are served from the cache
+        """
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+rate_provider = RateProvider()
@@ -1,14 +1,14 @@
 from typing import List, Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, UniqueConstraint,  func
+from sqlalchemy import Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, UniqueConstraint, Index, func
 
-from core.database import Base
+from core.database import Base, BigIntegerPK
 
 
 class User(Base):
     __tablename__ = "users"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
 
@@ -19,10 +19,12 @@ class Account(Base):
     __tablename__ = "accounts"
     __table_args__ = (
         UniqueConstraint("user_id", "name", name="uq_user_account_name"),
+        # Covers balance queries by user without touching the table
+        Index("ix_accounts_user_id", "user_id", mssql_include=["currency", "balance"]),
         {"extend_existing": True}
     )
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     description: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -42,7 +44,7 @@ class Account(Base):
 class Category(Base):
     __tablename__ = "categories"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     
@@ -52,7 +54,7 @@ class Category(Base):
 class Vendor(Base):
     __tablename__ = "vendors"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
@@ -62,7 +64,7 @@ class Vendor(Base):
 class Item(Base):
     __tablename__ = "items"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     category_id: Mapped[int] = mapped_column(ForeignKey("categories.id", ondelete="NO ACTION"), nullable=False)
@@ -83,7 +85,7 @@ class TransactionType(Base):
 class Transaction(Base):
     __tablename__ = "transactions"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     type_id: Mapped[int] = mapped_column(ForeignKey("transaction_types.id", ondelete="NO ACTION"), nullable=False)
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="NO ACTION"), nullable=False)
     amount: Mapped[float] = mapped_column(Float, nullable=False)
@@ -103,14 +105,94 @@ class Transaction(Base):
     type: Mapped["TransactionType"] = relationship("TransactionType", back_populates=None)
 
 
+# Serves listDTO and the keyset pages: seek by account, rows already in (transaction_date, id) desc order.
+# Filtered, so soft-deleted rows don't take space in it
+Index(
+    "ix_transactions_account_date",
+    Transaction.account_id,
+    Transaction.transaction_date.desc(),
+    Transaction.id.desc(),
+    mssql_where=Transaction.is_deleted == False
+)
+Index("ix_transactions_reference_transaction_id", Transaction.reference_transaction_id)
+# Soft-deleted rows: user's deleted history and the archiver's queue
+Index(
+    "ix_transactions_account_deleted_at",
+    Transaction.account_id,
+    Transaction.deleted_at.desc(),
+    mssql_where=Transaction.is_deleted == True
+)
+Index("ix_transactions_deleted_at", Transaction.deleted_at, mssql_where=Transaction.is_deleted == True)
+
+
+class TransactionArchive(Base):
+    """
+    Soft-deleted transactions moved out of the transactions table by the archiver, ids are kept
+    """
+    __tablename__ = "transactions_archive"
+    __table_args__ = (
+        Index("ix_transactions_archive_account_deleted_at", "account_id", "deleted_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    type_id: Mapped[int] = mapped_column(ForeignKey("transaction_types.id", ondelete="NO ACTION"), nullable=False)
+    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="NO ACTION"), nullable=False)
+    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    currency: Mapped[str] = mapped_column(String(3), nullable=False)
+    amount_in_account_currency: Mapped[float] = mapped_column(Float, nullable=False)
+    transaction_date: Mapped[Date] = mapped_column(Date, nullable=True)
+    description: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    reference_transaction_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    deleted_at: Mapped[str] = mapped_column(DateTime, nullable=False)
+    archived_at: Mapped[str] = mapped_column(DateTime, server_default=func.now())
+
+    account: Mapped["Account"] = relationship("Account")
+    type: Mapped["TransactionType"] = relationship("TransactionType", back_populates=None)
+
+
+class TransactionRollup(Base):
+    """
+    Totals of amount_in_account_currency per account, transaction type and day or month,
+    maintained along with the transactions. Transactions without a date are not rolled up.
+    """
+    __tablename__ = "transaction_rollups"
+    __table_args__ = (
+        UniqueConstraint("account_id", "period", "period_start", "type_id", name="uq_transaction_rollup"),
+    )
+
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
+    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False)
+    period: Mapped[str] = mapped_column(String(5), nullable=False)
+    period_start: Mapped[Date] = mapped_column(Date, nullable=False)
+    type_id: Mapped[int] = mapped_column(ForeignKey("transaction_types.id", ondelete="NO ACTION"), nullable=False)
+    total: Mapped[float] = mapped_column(Float, nullable=False, default=0.)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class Currency(Base):
     __tablename__ = "currencies"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     iso_code: Mapped[str] = mapped_column(String(10), nullable=False, unique=True)
 
 
+class FxRate(Base):
+    """
+    Daily rates from the nationalbank.kz feed: how many KZT one unit of the currency costs
+    """
+    __tablename__ = "fx_rates"
+    __table_args__ = (
+        UniqueConstraint("rate_date", "currency", name="uq_fx_rate_date_currency"),
+        Index("ix_fx_rates_currency_date", "currency", "rate_date", mssql_include=["rate"]),
+    )
+
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
+    rate_date: Mapped[Date] = mapped_column(Date, nullable=False)
+    currency: Mapped[str] = mapped_column(String(3), nullable=False)
+    rate: Mapped[float] = mapped_column(Float, nullable=False)
+
+
 # class TransactionPurchsedItem(Base):
 #     ...
 
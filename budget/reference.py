@@ -0,0 +1,60 @@
+# This module keeps reference data that practically never changes (transaction types and currencies) in memory.
+# It's loaded at startup and lazily on the first use, call refresh() to reload it on demand.
+
+from typing import Dict, List
+from budget.uow import UnitOfWork
+from budget.enums import TransactionTypesEnum
+from budget.schemas import CurrencyReadSchema, TransactionTypeReadSchema
+from budget.currencies import CurrencyResolver
+
+
+class ReferenceData:
+    def __init__(self) -> None:
+        self.transaction_types: Dict[TransactionTypesEnum, TransactionTypeReadSchema] = {}
+        self.currencies: Dict[str, CurrencyReadSchema] = {}
+        self.currency_resolver = CurrencyResolver([])
+        self.loaded = False
+
+    async def refresh(self, uow: UnitOfWork) -> None:
+        """
+        Reloads the data, uow must have `accounts` and `transactions` repositories and be inside `async with`
+        """
+        types = await uow.transactions.list_transaction_types()
+        currencies = await uow.accounts.list_currencies()
+        self.transaction_types = {
+            TransactionTypesEnum(type_.type_name): TransactionTypeReadSchema.model_validate(type_)
+            for type_ in types
+        }
+        self.currencies = {
+            currency.iso_code.upper(): CurrencyReadSchema(iso_code=currency.iso_code, name=currency.name)
+            for currency in currencies
+        }
+        self.currency_resolver = CurrencyResolver(list(self.currencies.values()))
+        self.loaded = True
+
+    def clear(self) -> None:
+        self.transaction_types, self.currencies, self.loaded = {}, {}, False
+        self.currency_resolver = CurrencyResolver([])
+
+    async def get_transaction_type(self, uow: UnitOfWork, name: TransactionTypesEnum) -> TransactionTypeReadSchema:
+        if not self.loaded or name not in self.transaction_types:
+            await self.refresh(uow)
+        return self.transaction_types[name]
+
+    async def get_currency(self, uow: UnitOfWork, iso_code: str) -> CurrencyReadSchema | None:
+        if not self.loaded:
+            await self.refresh(uow)
+        return self.currencies.get(iso_code.upper())
+
+    async def list_currencies(self, uow: UnitOfWork) -> List[CurrencyReadSchema]:
+        if not self.loaded:
+            await self.refresh(uow)
+        return list(self.currencies.values())
+
+    async def get_currency_resolver(self, uow: UnitOfWork) -> CurrencyResolver:
+        if not self.loaded:
+            await self.refresh(uow)
+        return self.currency_resolver
+
+
+reference_data = ReferenceData()
@@ -1,11 +1,15 @@
-from typing import List
-from sqlalchemy import select, func
+import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple, Union
+from sqlalchemy import select, insert, update, delete, func, case, and_, or_, cast, literal, literal_column, Date
 from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.exc import NoResultFound
 from core.schemas import Filter
 from core.repositories import BaseRepository
-from core.exceptions import InstanceNotFound
-from budget.models import User, Account, Currency, Transaction, TransactionType
+from core.exceptions import InstanceNotFound, InvalidCursor, FilterFieldNotAllowed, ConstraintsViolation
+from core.pagination import encode_cursor, decode_cursor
+from budget.models import User, Account, Currency, Transaction, TransactionArchive, TransactionType, TransactionRollup, FxRate
 from budget.schemas import (
     UserCreateSchema,
     UserUpdateSchema,
@@ -13,10 +17,35 @@ from budget.schemas import (
     AccountUpdateSchema,
     TransactionCreateSchema,
     TransactionUpdateSchema,
-    TransactionReadSchema
+    TransactionReadSchema,
+    TransactionDeletedReadSchema,
+    FxRateCreateSchema,
+    TransactionRollupCreateSchema
 ) 
 
 
+AGGREGATE_PERIODS = ('day', 'week', 'month')
+ROLLUP_PERIODS = ('day', 'month')
+
+
+def period_start(date, period: str, dialect: str):
+    """
+    First day of the date's day/week (Monday)/month, the expression depends on the dialect
+    """
+    if period == 'day':
+        return date
+    if dialect == 'mssql':
+        if period == 'week':
+            # Day 0 (1900-01-01) is Monday
+            return cast(func.dateadd(literal_column('week'), func.datediff(literal_column('day'), 0, date) // 7, 0), Date)
+        return func.datefromparts(func.year(date), func.month(date), 1)
+    if dialect == 'sqlite':
+        if period == 'week':
+            return func.date(date, 'weekday 0', '-6 days')
+        return func.strftime('%Y-%m-01', date)
+    return cast(func.date_trunc(period, date), Date)
+
+
 class UserRepository(BaseRepository[User, UserCreateSchema, UserUpdateSchema]):
     model = User
     allowed_fields = {
@@ -48,11 +77,69 @@ class AccountRepository(BaseRepository[Account, AccountCreateSchema, AccountUpda
         balance = await self._select(stmt)
         return balance.scalar_one_or_none() or 0.        
     
+    async def list_balances(self, user_id: int) -> List[Tuple[float, str]]:
+        stmt = select(self.model.balance, self.model.currency).filter(self.model.user_id==user_id)
+        balances = await self._select(stmt)
+        return balances.all()
+
+    async def apply_balance_deltas(self, deltas: Dict[int, float]) -> Dict[int, float]:
+        """
+        Adds deltas to accounts' balances with a single `UPDATE ... SET balance = balance + CASE id ...`,
+        so concurrent writes to the same account never lose an update. Returns new balances by account id.
+        Accounts already loaded into the session get the new balance without being marked as changed.
+        """
+        deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+        if not deltas:
+            return {}
+        stmt = update(Account) \
+            .where(Account.id.in_(list(deltas))) \
+            .values(balance=Account.balance + case(deltas, value=Account.id, else_=0.)) \
+            .returning(Account.id, Account.balance) \
+            .execution_options(synchronize_session=False)
+        result = await self.session.execute(stmt)
+        balances = {account_id: balance for account_id, balance in result.all()}
+        for account_id, balance in balances.items():
+            account = self.session.identity_map.get(identity_key(Account, account_id))
+            if account is not None:
+                set_committed_value(account, 'balance', balance)
+        return balances
+
     async def list_currencies(self) -> Currency:
         currencies = await self._select(select(Currency.iso_code, Currency.name))
         return currencies.all()
 
 
+class FxRateRepository(BaseRepository[FxRate, FxRateCreateSchema, FxRateCreateSchema]):
+    model = FxRate
+    allowed_fields = {
+        'rate_date': (FxRate.rate_date, None),
+        'currency': (FxRate.currency, None)
+    }
+
+    async def replace_rates(self, rate_date: datetime.date, rates: List[FxRateCreateSchema]) -> None:
+        await self.delete_where(filters=Filter.model_validate([{'field': 'rate_date', 'op': '=', 'value': rate_date}]))
+        await self.create_many(rates)
+
+    async def history(self, currencies: List[str], until: datetime.date) -> List[Tuple[str, datetime.date, float]]:
+        stmt = select(FxRate.currency, FxRate.rate_date, FxRate.rate) \
+            .where(FxRate.currency.in_(currencies), FxRate.rate_date <= until)
+        rates = await self._select(stmt)
+        return rates.all()
+
+    async def latest(self, currencies: List[str], until: datetime.date) -> List[Tuple[str, datetime.date, float]]:
+        """
+        The most recent rate of every currency on or before until, one row per currency
+        """
+        latest_dates = select(FxRate.currency, func.max(FxRate.rate_date).label('rate_date')) \
+            .where(FxRate.currency.in_(currencies), FxRate.rate_date <= until) \
+            .group_by(FxRate.currency) \
+            .subquery()
+        stmt = select(FxRate.currency, FxRate.rate_date, FxRate.rate) \
+            .join(latest_dates, and_(FxRate.currency == latest_dates.c.currency, FxRate.rate_date == latest_dates.c.rate_date))
+        rates = await self._select(stmt)
+        return rates.all()
+
+
 class TransactionRepository(BaseRepository[Transaction, TransactionCreateSchema, TransactionUpdateSchema]):
     model = Transaction
     allowed_fields = {
@@ -61,7 +148,9 @@ class TransactionRepository(BaseRepository[Transaction, TransactionCreateSchema,
         'user_id': (Account.user_id, 'account'),
         'account_id': (Transaction.account_id, None),
         'transaction_date': (Transaction.transaction_date, None),
-        'reference_transaction_id': (Transaction.reference_transaction_id, None)
+        'reference_transaction_id': (Transaction.reference_transaction_id, None),
+        'is_deleted': (Transaction.is_deleted, None),
+        'deleted_at': (Transaction.deleted_at, None)
     }
 
     async def get_transaction_type(self, name: str) -> int:
@@ -69,6 +158,10 @@ class TransactionRepository(BaseRepository[Transaction, TransactionCreateSchema,
         type_ = await self._select(stmt)
         return type_.scalar_one()
 
+    async def list_transaction_types(self) -> List[TransactionType]:
+        types = await self._select(select(TransactionType))
+        return types.scalars().all()
+
     async def getDTO(self, user_id: int, account_id: int, transaction_id: int) -> TransactionReadSchema:
         stmt = select(Transaction) \
             .join(Transaction.type) \
@@ -89,7 +182,91 @@ class TransactionRepository(BaseRepository[Transaction, TransactionCreateSchema,
         except NoResultFound:
             raise InstanceNotFound
         
+    def _listDTO_stmt(self, user_id: int):
+        return select(Transaction) \
+            .join(Transaction.type) \
+            .join(Transaction.account) \
+            .options(
+                contains_eager(Transaction.type),
+                contains_eager(Transaction.account)
+            ) \
+            .where(
+                Account.user_id==user_id,
+                Transaction.is_deleted == False
+            ) \
+            .order_by(Transaction.transaction_date.desc(), Transaction.id.desc())
+
     async def listDTO(self, user_id: int, filters: Filter=None, limit: int=10, offset: int=0) -> List[TransactionReadSchema]:
+        stmt = self._listDTO_stmt(user_id=user_id).limit(limit).offset(offset)
+        params = None
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
+            stmt = self._apply_joins(stmt, joins, False)
+            stmt = stmt.where(where_clause)
+        transactions = await self._select(stmt, params)
+        return [
+            TransactionReadSchema.model_validate(transaction)
+            for transaction in transactions.scalars().all()
+        ]
+
+    @staticmethod
+    def _after_cursor(cursor: str):
+        """
+        Rows that follow (transaction_date, id) from the cursor in `transaction_date desc, id desc` order.
+        Expanded into or/and because MSSQL has no row value comparison; NULL dates come last in desc order.
+        """
+        last_date, last_id = decode_cursor(cursor, 2)
+        if not isinstance(last_id, int):
+            raise InvalidCursor
+        if last_date is None:
+            return and_(Transaction.transaction_date.is_(None), Transaction.id < last_id)
+        try:
+            last_date = datetime.date.fromisoformat(last_date)
+        except (TypeError, ValueError):
+            raise InvalidCursor
+        return or_(
+            Transaction.transaction_date < last_date,
+            and_(Transaction.transaction_date == last_date, Transaction.id < last_id),
+            Transaction.transaction_date.is_(None)
+        )
+
+    async def listDTO_page(self, user_id: int, filters: Filter=None, limit: int=10, cursor: str=None) -> Tuple[List[TransactionReadSchema], Union[str, None]]:
+        """
+        Keyset pagination ordered by (transaction_date, id) desc, returns the page and the cursor of the next page
+        """
+        stmt = self._listDTO_stmt(user_id=user_id).limit(limit + 1)
+        params = None
+        if cursor:
+            stmt = stmt.where(self._after_cursor(cursor))
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
+            stmt = self._apply_joins(stmt, joins, False)
+            stmt = stmt.where(where_clause)
+        transactions = (await self._select(stmt, params)).scalars().all()
+        next_cursor = None
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            last = transactions[-1]
+            next_cursor = encode_cursor([last.transaction_date.isoformat() if last.transaction_date else None, last.id])
+        return [TransactionReadSchema.model_validate(transaction) for transaction in transactions], next_cursor
+
+    async def streamDTO(self, user_id: int, filters: Filter=None, batch_size: int=500) -> AsyncIterator[List[TransactionReadSchema]]:
+        """
+        All user's transactions in listDTO order, yielded batch by batch for exports and reports
+        """
+        stmt = self._listDTO_stmt(user_id=user_id)
+        params = None
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
+            stmt = self._apply_joins(stmt, joins, False)
+            stmt = stmt.where(where_clause)
+        async for transactions in self._stream(stmt, params, batch_size):
+            yield [TransactionReadSchema.model_validate(transaction) for transaction in transactions]
+
+    async def list_deletedDTO(self, user_id: int, filters: Filter=None, limit: int=10) -> List[TransactionDeletedReadSchema]:
+        """
+        Soft-deleted transactions that are not archived yet, recently deleted first
+        """
         stmt = select(Transaction) \
             .join(Transaction.type) \
             .join(Transaction.account) \
@@ -97,19 +274,395 @@ class TransactionRepository(BaseRepository[Transaction, TransactionCreateSchema,
                 contains_eager(Transaction.type),
                 contains_eager(Transaction.account)
             ) \
+            .where(
+                Account.user_id==user_id,
+                Transaction.is_deleted == True
+            ) \
+            .order_by(Transaction.deleted_at.desc(), Transaction.id.desc()) \
+            .limit(limit)
+        params = None
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
+            stmt = self._apply_joins(stmt, joins, False)
+            stmt = stmt.where(where_clause)
+        transactions = await self._select(stmt, params)
+        return [
+            TransactionDeletedReadSchema.model_validate(transaction)
+            for transaction in transactions.scalars().all()
+        ]
+
+    async def aggregate(
+        self,
+        user_id: int,
+        group_by: List[str],
+        filters: Filter=None,
+        keywords: List[str]=None,
+        limit: int=100
+    ) -> List[Dict[str, Any]]:
+        """
+        Sum, count and average of amounts in account currency grouped in the database.
+        Groups: type, account, currency (of the transaction), day, week, month and keyword (first of keywords found in the description).
+        Account currency is always a part of the group, so totals are never summed across currencies.
+        """
+        columns = {}
+        for group in dict.fromkeys(group_by):
+            if group == 'type':
+                columns['type'] = TransactionType.type_name
+            elif group == 'account':
+                columns['account_id'] = Account.id
+                columns['account_name'] = Account.name
+            elif group == 'currency':
+                columns['currency'] = Transaction.currency
+            elif group in AGGREGATE_PERIODS:
+                columns[group] = period_start(Transaction.transaction_date, group, self.session.get_bind().dialect.name)
+            elif group == 'keyword':
+                if not keywords:
+                    raise FilterFieldNotAllowed("Grouping by 'keyword' requires keywords.")
+                columns['keyword'] = case(
+                    *[
+                        (func.lower(Transaction.description).like(f'%{keyword.lower()}%'), keyword)
+                        for keyword in keywords
+                    ],
+                    else_=None
+                )
+            else:
+                raise FilterFieldNotAllowed(f"Grouping by '{group}' is not allowed.")
+        columns['account_currency'] = Account.currency
+
+        # Grouped in an outer query, because MSSQL doesn't match bound parameters of
+        # the same expression in SELECT and GROUP BY (keywords, period arithmetic)
+        ledger = select(
+                *[column.label(name) for name, column in columns.items()],
+                Transaction.id,
+                Transaction.amount,
+                Transaction.amount_in_account_currency
+            ) \
+            .select_from(Transaction) \
+            .join(Transaction.type) \
+            .join(Transaction.account) \
             .where(
                 Account.user_id==user_id,
                 Transaction.is_deleted == False
+            )
+        params = None
+        if filters:
+            # type and account are joined already
+            where_clause, _, params = self._build_filter(filters)
+            ledger = ledger.where(where_clause)
+        ledger = ledger.subquery()
+
+        groups = [ledger.c[name] for name in columns]
+        measures = [
+            func.sum(ledger.c.amount_in_account_currency).label('total'),
+            func.count(ledger.c.id).label('count'),
+            func.avg(ledger.c.amount_in_account_currency).label('average')
+        ]
+        if 'currency' in columns:
+            measures.append(func.sum(ledger.c.amount).label('total_in_currency'))
+        stmt = select(*groups, *measures) \
+            .group_by(*groups) \
+            .order_by(*groups) \
+            .limit(limit)
+        result = await self._select(stmt, params)
+        return [
+            {
+                name: round(value, 2) if isinstance(value, float)
+                else value.isoformat() if isinstance(value, datetime.date)
+                else value
+                for name, value in row._mapping.items()
+            }
+            for row in result.all()
+        ]
+
+
+class RollupRepository(BaseRepository[TransactionRollup, TransactionRollupCreateSchema, TransactionRollupCreateSchema]):
+    model = TransactionRollup
+    allowed_fields = {
+        'type': (TransactionType.type_name, 'type'),
+        'user_id': (Account.user_id, 'account'),
+        'account_id': (TransactionRollup.account_id, None),
+        'transaction_date': (TransactionRollup.period_start, None)
+    }
+
+    def _get_relationships(self) -> Dict[str, Any]:
+        # Rollups have no relationships, filters join accounts and types explicitly
+        return {}
+
+    async def _add(self, account_id: int, period: str, period_start: datetime.date, type_id: int, total: float, count: int) -> None:
+        stmt = update(TransactionRollup) \
+            .where(
+                TransactionRollup.account_id==account_id,
+                TransactionRollup.period==period,
+                TransactionRollup.period_start==period_start,
+                TransactionRollup.type_id==type_id
+            ) \
+            .values(total=TransactionRollup.total + total, count=TransactionRollup.count + count) \
+            .execution_options(synchronize_session=False)
+        result = await self.session.execute(stmt)
+        if result.rowcount:
+            return
+        try:
+            async with self.session.begin_nested():
+                await self.create(TransactionRollupCreateSchema(
+                    account_id=account_id,
+                    period=period,
+                    period_start=period_start,
+                    type_id=type_id,
+                    total=total,
+                    count=count
+                ))
+        except ConstraintsViolation:
+            # Another transaction has just inserted the row
+            await self.session.execute(stmt)
+
+    async def apply(self, transactions: List[Transaction], sign: int=1) -> None:
+        """
+        Adds transactions to their day and month rollups, sign=-1 takes them away
+        """
+        deltas: Dict[tuple, Tuple[float, int]] = {}
+        for transaction in transactions:
+            date = transaction.transaction_date
+            if date is None:
+                continue
+            if isinstance(date, datetime.datetime):
+                date = date.date()
+            for period, start in (('day', date), ('month', date.replace(day=1))):
+                key = (transaction.account_id, period, start, transaction.type_id)
+                total, count = deltas.get(key, (0., 0))
+                deltas[key] = (total + sign * transaction.amount_in_account_currency, count + sign)
+        for (account_id, period, start, type_id), (total, count) in deltas.items():
+            await self._add(account_id, period, start, type_id, total, count)
+
+    def _ledger(self, period: str, account_ids: List[int]=None):
+        """
+        Rollup rows computed from the transactions
+        """
+        start = period_start(Transaction.transaction_date, period, self.session.get_bind().dialect.name)
+        rows = select(
+                Transaction.account_id,
+                start.label('period_start'),
+                Transaction.type_id,
+                Transaction.id,
+                Transaction.amount_in_account_currency
             ) \
-            .order_by(Transaction.transaction_date.desc(), Transaction.id.desc()) \
-            .limit(limit).offset(offset)
+            .where(Transaction.is_deleted == False, Transaction.transaction_date.is_not(None))
+        if account_ids:
+            rows = rows.where(Transaction.account_id.in_(account_ids))
+        # Grouped in an outer query, see TransactionRepository.aggregate
+        rows = rows.subquery()
+        return select(
+                rows.c.account_id,
+                literal(period).label('period'),
+                rows.c.period_start,
+                rows.c.type_id,
+                func.sum(rows.c.amount_in_account_currency).label('total'),
+                func.count(rows.c.id).label('count')
+            ) \
+            .group_by(rows.c.account_id, rows.c.period_start, rows.c.type_id)
+
+    async def rebuild(self, account_ids: List[int]=None) -> int:
+        """
+        Recomputes rollups of the accounts (all accounts by default) from the transactions, returns the number of rows
+        """
+        stmt = delete(TransactionRollup)
+        if account_ids:
+            stmt = stmt.where(TransactionRollup.account_id.in_(account_ids))
+        await self.session.execute(stmt.execution_options(synchronize_session=False))
+        rows = 0
+        for period in ROLLUP_PERIODS:
+            columns = ['account_id', 'period', 'period_start', 'type_id', 'total', 'count']
+            result = await self.session.execute(
+                insert(TransactionRollup).from_select(columns, self._ledger(period, account_ids))
+            )
+            rows += result.rowcount
+        return rows
+
+    async def check(self, account_ids: List[int]=None) -> List[Dict[str, Any]]:
+        """
+        Compares rollups with the transactions, returns mismatching rows (empty list if consistent)
+        """
+        def _key(row) -> tuple:
+            start = row.period_start
+            start = start.isoformat() if isinstance(start, datetime.date) else str(start)[:10]
+            return (row.account_id, row.period, start, row.type_id)
+
+        expected = {}
+        for period in ROLLUP_PERIODS:
+            for row in (await self._select(self._ledger(period, account_ids))).all():
+                expected[_key(row)] = (row.total, row.count)
+
+        stmt = select(TransactionRollup).where(TransactionRollup.count != 0)
+        if account_ids:
+            stmt = stmt.where(TransactionRollup.account_id.in_(account_ids))
+        actual = {
+            _key(row): (row.total, row.count)
+            for row in (await self._select(stmt)).scalars().all()
+        }
+
+        mismatches = []
+        for key in sorted(expected.keys() | actual.keys(), key=str):
+            expected_total, expected_count = expected.get(key, (0., 0))
+            actual_total, actual_count = actual.get(key, (0., 0))
+            if expected_count != actual_count or abs(expected_total - actual_total) > 0.005:
+                account_id, period, start, type_id = key
+                mismatches.append({
+                    'account_id': account_id,
+                    'period': period,
+                    'period_start': start,
+                    'type_id': type_id,
+                    'expected': {'total': expected_total, 'count': expected_count},
+                    'actual': {'total': actual_total, 'count': actual_count}
+                })
+        return mismatches
+
+    async def aggregate(
+        self,
+        user_id: int,
+        group_by: List[str],
+        filters: Filter=None,
+        limit: int=100
+    ) -> List[Dict[str, Any]]:
+        """
+        Same rows as TransactionRepository.aggregate for groups type, account, day and month,
+        read from rollups instead of the transactions
+        """
+        dialect = self.session.get_bind().dialect.name
+        # Month rollups are enough unless days matter
+        period = 'month' if 'day' not in group_by and not (filters and 'transaction_date' in filters.fields) else 'day'
+        columns = {}
+        for group in dict.fromkeys(group_by):
+            if group == 'type':
+                columns['type'] = TransactionType.type_name
+            elif group == 'account':
+                columns['account_id'] = Account.id
+                columns['account_name'] = Account.name
+            elif group in ROLLUP_PERIODS:
+                columns[group] = period_start(TransactionRollup.period_start, group, dialect) if group != period else TransactionRollup.period_start
+            else:
+                raise FilterFieldNotAllowed(f"Grouping by '{group}' is not allowed.")
+        columns['account_currency'] = Account.currency
+
+        rows = select(
+                *[column.label(name) for name, column in columns.items()],
+                TransactionRollup.total,
+                TransactionRollup.count
+            ) \
+            .select_from(TransactionRollup) \
+            .join(TransactionType, TransactionType.id==TransactionRollup.type_id) \
+            .join(Account, Account.id==TransactionRollup.account_id) \
+            .where(
+                Account.user_id==user_id,
+                TransactionRollup.period==period,
+                TransactionRollup.count != 0
+            )
+        params = None
         if filters:
-            where_clause, joins = self._build_filter(filters)
+            where_clause, _, params = self._build_filter(filters)
+            rows = rows.where(where_clause)
+        rows = rows.subquery()
+
+        groups = [rows.c[name] for name in columns]
+        stmt = select(
+                *groups,
+                func.sum(rows.c.total).label('total'),
+                func.sum(rows.c.count).label('count')
+            ) \
+            .group_by(*groups) \
+            .order_by(*groups) \
+            .limit(limit)
+        result = await self._select(stmt, params)
+        summary = []
+        for row in result.all():
+            row = dict(row._mapping)
+            row['average'] = row['total'] / row['count'] if row['count'] else 0.
+            summary.append({
+                name: round(value, 2) if isinstance(value, float)
+                else value.isoformat() if isinstance(value, datetime.date)
+                else value
+                for name, value in row.items()
+            })
+        return summary
+
+
+class TransactionArchiveRepository(BaseRepository[TransactionArchive, TransactionCreateSchema, TransactionUpdateSchema]):
+    model = TransactionArchive
+    allowed_fields = {
+        'id': (TransactionArchive.id, None),
+        'type': (TransactionType.type_name, 'type'),
+        'user_id': (Account.user_id, 'account'),
+        'account_id': (TransactionArchive.account_id, None),
+        'transaction_date': (TransactionArchive.transaction_date, None),
+        'reference_transaction_id': (TransactionArchive.reference_transaction_id, None),
+        'deleted_at': (TransactionArchive.deleted_at, None)
+    }
+
+    async def archive_batch(self, deleted_before: datetime.datetime, batch_size: int=500) -> int:
+        """
+        Moves up to batch_size transactions soft-deleted before `deleted_before` from the transactions table
+        into the archive, the other legs of their transfers go along. Returns the number of moved rows.
+        """
+        deleted = and_(Transaction.is_deleted == True, Transaction.deleted_at < deleted_before)
+        rows = await self._select(
+            select(Transaction.id, Transaction.reference_transaction_id)
+                .where(deleted)
+                .order_by(Transaction.deleted_at, Transaction.id)
+                .limit(batch_size)
+        )
+        rows = rows.all()
+        if not rows:
+            return 0
+        ids = {id_ for id_, _ in rows}
+        references = {reference for _, reference in rows if reference is not None} - ids
+        legs = await self._select(
+            select(Transaction.id).where(
+                deleted,
+                or_(Transaction.reference_transaction_id.in_(ids), Transaction.id.in_(references))
+            )
+        )
+        ids = sorted(ids | set(legs.scalars().all()))
+
+        columns = [column.name for column in TransactionArchive.__table__.columns if column.name != 'archived_at']
+        await self.session.execute(
+            insert(TransactionArchive).from_select(
+                columns,
+                select(*[Transaction.__table__.columns[name] for name in columns]).where(Transaction.id.in_(ids))
+            )
+        )
+        # The archive keeps the references, rows left behind must not point to the deleted ones
+        await self.session.execute(
+            update(Transaction)
+                .where(Transaction.reference_transaction_id.in_(ids))
+                .values(reference_transaction_id=None)
+                .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(
+            delete(Transaction)
+                .where(Transaction.id.in_(ids))
+                .execution_options(synchronize_session=False)
+        )
+        return len(ids)
+
+    async def listDTO(self, user_id: int, filters: Filter=None, limit: int=10) -> List[TransactionDeletedReadSchema]:
+        """
+        Archived transactions, recently deleted first
+        """
+        stmt = select(TransactionArchive) \
+            .join(TransactionArchive.type) \
+            .join(TransactionArchive.account) \
+            .options(
+                contains_eager(TransactionArchive.type),
+                contains_eager(TransactionArchive.account)
+            ) \
+            .where(Account.user_id==user_id) \
+            .order_by(TransactionArchive.deleted_at.desc(), TransactionArchive.id.desc()) \
+            .limit(limit)
+        params = None
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
             stmt = self._apply_joins(stmt, joins, False)
             stmt = stmt.where(where_clause)
-        transactions = await self._select(stmt)
+        transactions = await self._select(stmt, params)
         return [
-            TransactionReadSchema.model_validate(transaction)
+            TransactionDeletedReadSchema.model_validate(transaction)
             for transaction in transactions.scalars().all()
-        ] 
-        
+        ]
@@ -1,4 +1,5 @@
 import datetime
+from typing import Literal
 from pydantic import BaseModel, Field, model_validator, model_serializer, field_serializer, ConfigDict
 from budget.enums import TransactionTypesEnum
 
@@ -63,6 +64,21 @@ class CurrencyReadSchema(BaseModel):
     name: str
 
 
+class FxRateCreateSchema(BaseModel):
+    rate_date: datetime.date
+    currency: str = Field(..., min_length=3, max_length=3)
+    rate: float
+
+
+class TransactionRollupCreateSchema(BaseModel):
+    account_id: int
+    period: Literal['day', 'month']
+    period_start: datetime.date
+    type_id: int
+    total: float
+    count: int
+
+
 class TransactionTypeReadSchema(BaseModel):
     id: int
     type_name: TransactionTypesEnum
@@ -148,6 +164,21 @@ class TransactionTransferCreateInputSchema(TransactionCreateInputSchema):
     amount_in_account_currency_to: float | None = None
 
 
+class TransactionBatchEntryInputSchema(BaseModel):
+    type: Literal[TransactionTypesEnum.TOPUP, TransactionTypesEnum.WITHDRAW, TransactionTypesEnum.PURCHASE]
+    account_id: int
+    amount: float
+    currency: str = Field(..., min_length=3, max_length=3)
+    amount_in_account_currency: float | None = None
+    transaction_date: datetime.date | None = None
+    description: str | None = None
+
+
+class TransactionBatchCreateInputSchema(BaseModel):
+    user_id: int
+    transactions: list[TransactionBatchEntryInputSchema] = Field(..., min_length=1, max_length=50)
+
+
 
 class TransactionUpdateSchema(BaseModel):
     ...
@@ -169,3 +200,13 @@ class TransactionReadSchema(BaseModel):
     @field_serializer('transaction_date')
     def serializer_transaction_date(self, value: datetime.datetime) -> str:
         return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class TransactionDeletedReadSchema(TransactionReadSchema):
+    description: str | None = None
+    reference_transaction_id: int | None = None
+    deleted_at: datetime.datetime
+
+    @field_serializer('deleted_at')
+    def serializer_deleted_at(self, value: datetime.datetime) -> str:
+        return value.strftime('%Y-%m-%d %H:%M:%S')
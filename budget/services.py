@@ -1,16 +1,17 @@
-import asyncio
 import datetime
-from typing import List, Dict, Any
-from thefuzz import process, fuzz
-import requests
-from bs4 import BeautifulSoup
-from core.schemas import Filter
+from typing import AsyncIterator, List, Dict, Any
+from pydantic import ValidationError
+from core.schemas import Filter, Page
 from core.exceptions import (
     InstanceNotFound, 
     ConstraintsViolation, 
 )
 from budget.uow import UnitOfWork
 from budget.enums import TransactionTypesEnum
+from budget.models import Transaction
+from budget.reference import reference_data
+from budget.fx import rate_provider
+from budget.conversion import RateTable, RATES_BASE_CURRENCY
 from budget.schemas import (
     UserCreateSchema,
     UserReadSchema,
@@ -26,7 +27,10 @@ from budget.schemas import (
     TransactionCreateInputSchema,
     TransactionPurchaseCreateInputSchema,
     TransactionTransferCreateInputSchema,
-    TransactionReadSchema
+    TransactionBatchCreateInputSchema,
+    TransactionReadSchema,
+    TransactionDeletedReadSchema,
+    FxRateCreateSchema
 )
 from budget.exceptions import (
     UserNotFound, 
@@ -34,10 +38,16 @@ from budget.exceptions import (
     AccountNotFound,
     AccountAlreadyExists,
     CurrencyNotFound,
-    TransactionNotFound
+    TransactionNotFound,
+    InvalidTransaction
 )
 
 
+# Summaries that rollups can answer
+ROLLUP_GROUPS = {'type', 'account', 'day', 'month'}
+ROLLUP_FILTER_FIELDS = {'type', 'user_id', 'account_id', 'transaction_date'}
+
+
 class BaseService:
     def __init__(self, uow: UnitOfWork) -> None:
         self.uow = uow
@@ -63,8 +73,8 @@ class AccountService(BaseService):
     async def create_account(self, account_data: AccountCreateSchema) -> AccountReadSchema:
         try:
             account = await self.uow.accounts.create(account_data)
-            type_ = await self.uow.transactions.get_transaction_type(name=TransactionTypesEnum.TOPUP)
-            _ = await self.uow.transactions.create(
+            type_ = await reference_data.get_transaction_type(self.uow, TransactionTypesEnum.TOPUP)
+            transaction = await self.uow.transactions.create(
                 item_data = TransactionCreateSchema(
                     type=type_,
                     account=account,
@@ -73,6 +83,7 @@ class AccountService(BaseService):
                     description='Init balance'
                 )
             )
+            await self.uow.rollups.apply([transaction])
             return AccountReadSchema.model_validate(account)
         except ConstraintsViolation:
             raise AccountAlreadyExists
@@ -94,43 +105,56 @@ class AccountService(BaseService):
             for account in accounts
         ]
 
+    async def list_accounts_page(self, user_id: int, filters: Filter=None, limit: int=10, cursor: str=None) -> Page[AccountReadSchema]:
+        filters: List = filters.model_dump() if filters else []
+        filters.append({'field': 'user_id', 'op': '=', 'value': user_id})
+        accounts, next_cursor = await self.uow.accounts.list_page(filters=Filter.model_validate(filters), limit=limit, cursor=cursor)
+        return Page[AccountReadSchema](
+            items=[AccountReadSchema.model_validate(account) for account in accounts],
+            next_cursor=next_cursor
+        )
+
     async def update_account(self, account_data: AccountUpdateInputSchema) -> AccountReadSchema:
         account_data_dict = account_data.model_dump()
         account_id = account_data_dict.pop('id')
         user_id = account_data_dict.pop('user_id')
         user_filter = Filter.model_validate([{'field': 'user_id', 'op': '=', 'value': user_id}])
         try:
-            account = await self.uow.accounts.update(
+            accounts = await self.uow.accounts.update_where(
                 id=account_id, 
                 item_data=AccountUpdateSchema.model_validate(account_data_dict),
-                filters=user_filter
+                filters=user_filter,
+                returning=True
             )
-            return AccountReadSchema.model_validate(account)
-        except InstanceNotFound:
-            raise AccountNotFound
         except ConstraintsViolation:
             raise AccountAlreadyExists
+        if not accounts:
+            raise AccountNotFound
+        return AccountReadSchema.model_validate(accounts[0])
 
-    async def get_user_balance(self, user_id: int) -> float:
-        return await self.uow.accounts.get_user_balance(user_id=user_id)
+    async def get_user_balance(self, user_id: int, base_currency: str=None) -> float:
+        """
+        Without base_currency balances are summed as is, otherwise every account is converted
+        into base_currency by today's stored rates
+        """
+        if base_currency is None:
+            return await self.uow.accounts.get_user_balance(user_id=user_id)
+        balances = await self.uow.accounts.list_balances(user_id=user_id)
+        if not balances:
+            return 0.
+        base_currency = base_currency.upper()
+        today = datetime.date.today()
+        amounts, currencies = zip(*balances)
+        rates = await self.uow.fx_rates.latest(currencies=list({*currencies, base_currency}), until=today)
+        converted = RateTable(rates).convert(amounts, currencies, [today] * len(amounts), base_currency)
+        return round(float(converted.sum()), 2)
 
     async def find_currency(self, name: str) -> CurrencyReadSchema:
-        currencies = await self.uow.accounts.list_currencies()
-
-        # Trying to find similar value
-        choices = [f'{c.iso_code.upper()}:{c.name.upper()}' for c in currencies]
-        similarities = process.extract(name.strip().upper(), choices, scorer=fuzz.partial_token_sort_ratio, limit=1)
-        currency, prob = similarities[0]
-
-        # Consider that there're no rows returtn
-        if prob <= 50:
+        resolver = await reference_data.get_currency_resolver(self.uow)
+        currency = resolver.resolve(name)
+        if currency is None:
             raise CurrencyNotFound
-        iso_code, _ = currency.split(':')
-
-        # Returning the value without upper() and slicers
-        currency = [f"{c.name}" for c in currencies if c.iso_code==iso_code][0]
-        return CurrencyReadSchema(name=currency, iso_code=iso_code)
-
+        return currency
 
 
 class TransactionService(BaseService):
@@ -143,6 +167,41 @@ class TransactionService(BaseService):
     async def list_transactions(self, user_id: int, filters: Filter=None, limit: int=10, offset: int=0) -> List[TransactionReadSchema]:
         return await self.uow.transactions.listDTO(user_id=user_id, filters=filters, limit=limit, offset=offset)
 
+    async def list_transactions_page(self, user_id: int, filters: Filter=None, limit: int=10, cursor: str=None) -> Page[TransactionReadSchema]:
+        transactions, next_cursor = await self.uow.transactions.listDTO_page(user_id=user_id, filters=filters, limit=limit, cursor=cursor)
+        return Page[TransactionReadSchema](items=transactions, next_cursor=next_cursor)
+
+    async def stream_transactions(self, user_id: int, filters: Filter=None, batch_size: int=500) -> AsyncIterator[List[TransactionReadSchema]]:
+        async for transactions in self.uow.transactions.streamDTO(user_id=user_id, filters=filters, batch_size=batch_size):
+            yield transactions
+
+    async def summarize_transactions(
+        self,
+        user_id: int,
+        group_by: List[str],
+        filters: Filter=None,
+        keywords: List[str]=None,
+        limit: int=100
+    ) -> List[Dict[str, Any]]:
+        if set(group_by) <= ROLLUP_GROUPS and (filters is None or filters.fields <= ROLLUP_FILTER_FIELDS):
+            # A few rollup rows instead of scanning the transactions
+            return await self.uow.rollups.aggregate(user_id=user_id, group_by=group_by, filters=filters, limit=limit)
+        return await self.uow.transactions.aggregate(
+            user_id=user_id,
+            group_by=group_by,
+            filters=filters,
+            keywords=keywords,
+            limit=limit
+        )
+
+    @staticmethod
+    def _to_read_schema(transaction: Transaction, type_: TransactionTypeReadSchema) -> TransactionReadSchema:
+        # The type comes from the reference data, so transaction.type is not loaded into the session
+        return TransactionReadSchema.model_validate({
+            **{field: getattr(transaction, field) for field in TransactionReadSchema.model_fields if field != 'type'},
+            'type': type_
+        })
+
     async def _create_transaction(self, type_: TransactionTypeReadSchema, transaction_data_dict: Dict[str, Any]) -> TransactionReadSchema:
         user_id = transaction_data_dict.pop('user_id')
         account_id = transaction_data_dict.pop('account_id')
@@ -159,32 +218,33 @@ class TransactionService(BaseService):
                 **transaction_data_dict
             )
         )
-        account.balance += transaction.amount
-        return TransactionReadSchema.model_validate(transaction)
+        await self.uow.accounts.apply_balance_deltas({account.id: transaction.amount})
+        await self.uow.rollups.apply([transaction])
+        return self._to_read_schema(transaction, type_)
 
     async def create_topup(self, transaction_data=TransactionCreateInputSchema) -> TransactionReadSchema:
-        type_ = await self.uow.transactions.get_transaction_type(name=TransactionTypesEnum.TOPUP)
+        type_ = await reference_data.get_transaction_type(self.uow, TransactionTypesEnum.TOPUP)
         return await self._create_transaction(
-            type_=TransactionTypeReadSchema.model_validate(type_),
+            type_=type_,
             transaction_data_dict=transaction_data.model_dump()
         )
 
     async def create_withdraw(self, transaction_data=TransactionCreateInputSchema):
-        type_ = await self.uow.transactions.get_transaction_type(name=TransactionTypesEnum.WITHDRAW)
+        type_ = await reference_data.get_transaction_type(self.uow, TransactionTypesEnum.WITHDRAW)
         return await self._create_transaction(
-            type_=TransactionTypeReadSchema.model_validate(type_),
+            type_=type_,
             transaction_data_dict=transaction_data.model_dump()
         )
 
     async def create_purchase(self, transaction_data=TransactionPurchaseCreateInputSchema):
-        type_ = await self.uow.transactions.get_transaction_type(name=TransactionTypesEnum.PURCHASE)
+        type_ = await reference_data.get_transaction_type(self.uow, TransactionTypesEnum.PURCHASE)
         return await self._create_transaction(
-            type_=TransactionTypeReadSchema.model_validate(type_),
+            type_=type_,
             transaction_data_dict=transaction_data.model_dump()
         )
 
     async def create_transfer(self, transaction_data=TransactionTransferCreateInputSchema) -> TransactionReadSchema:
-        type_ = await self.uow.transactions.get_transaction_type(name=TransactionTypesEnum.TRANSFER)
+        type_ = await reference_data.get_transaction_type(self.uow, TransactionTypesEnum.TRANSFER)
         transaction_data_dict = transaction_data.model_dump()
         user_id = transaction_data_dict.pop('user_id')
         account_id = transaction_data_dict.pop('account_id')
@@ -197,74 +257,135 @@ class TransactionService(BaseService):
             limit=2
         )
         try:
-            transaction_from = await self.uow.transactions.create(
-                item_data=TransactionTransferFromCreateSchema(
+            amount_in_account_currency_to = transaction_data_dict.pop('amount_in_account_currency_to', None)
+            transaction_from, transaction_to = await self.uow.transactions.create_many([
+                TransactionTransferFromCreateSchema(
                     type=type_,
                     account=[account for account in accounts if account.id==account_id][0],
                     **transaction_data_dict
-                )
-            )
-            _ = transaction_data_dict.pop('amount_in_account_currency')
-            transaction_to = await self.uow.transactions.create(
-                item_data=TransactionTransferToCreateSchema(
+                ),
+                TransactionTransferToCreateSchema(
                     type=type_,
                     account=[account for account in accounts if account.id==account_id_to][0],
-                    amount_in_account_currency=transaction_data_dict.pop('amount_in_account_currency_to', None),
-                    **transaction_data_dict
+                    **{**transaction_data_dict, 'amount_in_account_currency': amount_in_account_currency_to}
                 )
-            )
+            ])
             transaction_from.reference_transaction_id=transaction_to.id
             transaction_to.reference_transaction_id=transaction_from.id
-            [account for account in accounts if account.id==account_id][0].balance += transaction_from.amount
-            [account for account in accounts if account.id==account_id_to][0].balance += transaction_to.amount
-            return TransactionReadSchema.model_validate(transaction_from)
+            deltas = {account_id: transaction_from.amount}
+            deltas[account_id_to] = deltas.get(account_id_to, 0.) + transaction_to.amount
+            await self.uow.accounts.apply_balance_deltas(deltas)
+            await self.uow.rollups.apply([transaction_from, transaction_to])
+            return self._to_read_schema(transaction_from, type_)
         except IndexError:
             raise AccountNotFound
 
+    async def create_transactions_batch(self, transaction_data: TransactionBatchCreateInputSchema) -> List[TransactionReadSchema]:
+        """
+        Topups, withdraws and purchases in one go: every entry is validated before anything is written,
+        then all of them are inserted with one statement and each account's balance is updated once
+        """
+        entries = transaction_data.transactions
+        account_ids = list({entry.account_id for entry in entries})
+        accounts = await self.uow.accounts.list(
+            filters=Filter.model_validate([
+                {'field': 'user_id', 'op': '=', 'value': transaction_data.user_id},
+                {'field': 'id', 'op': 'in', 'value': account_ids}
+            ]),
+            limit=len(account_ids)
+        )
+        accounts = {account.id: account for account in accounts}
+        if len(accounts) != len(account_ids):
+            raise AccountNotFound
+
+        types = {}
+        items = []
+        for i, entry in enumerate(entries, start=1):
+            if entry.type not in types:
+                types[entry.type] = await reference_data.get_transaction_type(self.uow, entry.type)
+            try:
+                items.append(TransactionCreateSchema(
+                    type=types[entry.type],
+                    account=accounts[entry.account_id],
+                    **entry.model_dump(exclude={'type', 'account_id'})
+                ))
+            except ValidationError as e:
+                raise InvalidTransaction(f'Transaction #{i}: {e.errors()[0]["msg"]}')
+
+        transactions = await self.uow.transactions.create_many(items)
+        deltas = {}
+        for transaction in transactions:
+            deltas[transaction.account_id] = deltas.get(transaction.account_id, 0.) + transaction.amount
+        await self.uow.accounts.apply_balance_deltas(deltas)
+        await self.uow.rollups.apply(transactions)
+        return [self._to_read_schema(transaction, item.type) for transaction, item in zip(transactions, items)]
+
     async def update_transaction(self) -> None:
         raise NotImplementedError
 
     async def delete_transaction(self, user_id: int, account_id: int, transaction_id: int) -> None:
-        try:
-            transaction = await self.uow.transactions.get(
-                id=transaction_id, 
-                filters=Filter.model_validate([
-                    {'field': 'user_id', 'op': '=', 'value': user_id},
-                    {'field': 'account_id', 'op': '=', 'value': account_id}
-                ])
-            )
-        except InstanceNotFound:
+        deleted_at = datetime.datetime.now()
+        transactions = await self.uow.transactions.update_where(
+            id=transaction_id,
+            item_data={'is_deleted': True, 'deleted_at': deleted_at},
+            filters=Filter.model_validate([
+                {'field': 'user_id', 'op': '=', 'value': user_id},
+                {'field': 'account_id', 'op': '=', 'value': account_id},
+                {'field': 'is_deleted', 'op': '=', 'value': False}
+            ]),
+            returning=True
+        )
+        if not transactions:
             raise TransactionNotFound
-        
-        reference_transactions = await self.uow.transactions.list(
+
+        # The other leg of a transfer
+        transactions += await self.uow.transactions.update_where(
+            item_data={'is_deleted': True, 'deleted_at': deleted_at},
             filters=Filter.model_validate([
-                {'field': 'reference_transaction_id', 'op': '=', 'value': transaction_id}
-            ])
+                {'field': 'reference_transaction_id', 'op': '=', 'value': transaction_id},
+                {'field': 'is_deleted', 'op': '=', 'value': False}
+            ]),
+            returning=True
         )
+        deltas = {}
+        for transaction in transactions:
+            deltas[transaction.account_id] = deltas.get(transaction.account_id, 0.) - transaction.amount
+        await self.uow.accounts.apply_balance_deltas(deltas)
+        await self.uow.rollups.apply(transactions, sign=-1)
 
-        transaction.is_deleted = True
-        transaction.deleted_at = datetime.datetime.now()
-        account = await self.uow.accounts.get(id=transaction.account_id)
-        account.balance -= transaction.amount
-        for ref_transaction in reference_transactions:
-            ref_transaction.is_deleted = True
-            ref_transaction.deleted_at = datetime.datetime.now()
-            ref_account = await self.uow.accounts.get(id=ref_transaction.account_id)
-            ref_account.balance -= ref_transaction.amount
+    async def list_deleted_transactions(self, user_id: int, filters: Filter=None, limit: int=10, offset: int=0) -> List[TransactionDeletedReadSchema]:
+        """
+        Deleted transactions, recently deleted first: the ones still in the ledger and the archived ones
+        """
+        recent = await self.uow.transactions.list_deletedDTO(user_id=user_id, filters=filters, limit=limit + offset)
+        archived = await self.uow.archive.listDTO(user_id=user_id, filters=filters, limit=limit + offset)
+        transactions = sorted(recent + archived, key=lambda transaction: (transaction.deleted_at, transaction.id), reverse=True)
+        return transactions[offset:offset + limit]
+
+    async def archive_deleted_transactions(self, deleted_before: datetime.datetime, batch_size: int=500) -> int:
+        return await self.uow.archive.archive_batch(deleted_before=deleted_before, batch_size=batch_size)
+
+
+class RollupService(BaseService):
+    async def rebuild(self, account_ids: List[int]=None) -> int:
+        return await self.uow.rollups.rebuild(account_ids=account_ids)
+
+    async def check(self, account_ids: List[int]=None) -> List[Dict[str, Any]]:
+        return await self.uow.rollups.check(account_ids=account_ids)
 
 
 class CurrencyService(BaseService):
     async def get_currency_rate(self, first: str, second: str) -> float:
-        loop = asyncio.get_event_loop()
-        url = "https://nationalbank.kz/rss/rates_all.xml"
-        response = await loop.run_in_executor(None, requests.get, url)
-        print(type(response))
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'xml')
-        first_value, second_value = 1., 1.
-        for item in soup.find_all('item'):
-            if item.find('title').text.strip() == first:
-                first_value = float(item.find('description').text.strip()) / int(item.find('quant').text.strip())
-            if item.find('title').text.strip() == second:
-                second_value = float(item.find('description').text.strip()) / int(item.find('quant').text.strip())
-        return round(first_value / second_value, 2)
+        return await rate_provider.get_rate(first, second)
+
+    async def store_rates(self, rate_date: datetime.date, rates: Dict[str, float]) -> None:
+        """
+        Saves the day's rate table, rates are in KZT for one unit of the currency
+        """
+        await self.uow.fx_rates.replace_rates(
+            rate_date=rate_date,
+            rates=[
+                FxRateCreateSchema(rate_date=rate_date, currency=currency, rate=rate)
+                for currency, rate in rates.items() if currency != RATES_BASE_CURRENCY
+            ]
+        )
@@ -1,35 +1,15 @@
 from typing import Type, Dict
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from core.uow import UnitOfWork as BaseUnitOfWork
 from budget.repositories import BaseRepository
 
 
-class UnitOfWork:
-    def __init__(self, session: AsyncSession, repositories: Dict[str, Type[BaseRepository]]=None) -> None:
-        self.session_factory = session
-        self.repositories = repositories or {}
+class UnitOfWork(BaseUnitOfWork):
+    """
+    Session and repositories are scoped to each `async with` block (see core.uow.UnitOfWork),
+    so a single instance is safe to share between concurrently running handlers.
+    """
+    session: AsyncSession
 
-    def add_repository(self, label: str, repository: BaseRepository) -> None:
-        self.repositories[label] = repository
-
-    async def __aenter__(self):
-        async with self.session_factory() as session:
-            self.session: AsyncSession = session
-            for label, repository in self.repositories.items():
-                setattr(self, label, repository(session))
-            return self
-        
-    async def __aexit__(self, *args):
-        await self.session.rollback()
-        await self.session.close()
-
-    async def commit(self) -> None:
-        await self.session.commit()
-
-    async def rollback(self) -> None:
-        await self.session.rollback()
-
-    async def refresh(self, instance) -> None:
-        await self.session.refresh(instance)
-
-    async def flush(self) -> None:
-        await self.session.flush()
+    def __init__(self, session: async_sessionmaker[AsyncSession], repositories: Dict[str, Type[BaseRepository]]=None) -> None:
+        super().__init__(session=session, repositories=repositories)
@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, BigInteger, Integer
 from sqlalchemy.engine.url import URL
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
@@ -36,13 +36,17 @@ connection_url = URL.create(
 )
 
 SyncSession = sessionmaker(
-    bind=create_engine(connection_url, echo=True),
+    bind=create_engine(connection_url, echo=True, fast_executemany=True),
 )
 
 Session = async_sessionmaker(
-    bind=create_async_engine(async_connection_url, echo=True),
+    bind=create_async_engine(async_connection_url, echo=True, fast_executemany=True),
 )
 
 
 class Base(DeclarativeBase):
     ...
+
+
+# SQLite autoincrements only INTEGER PRIMARY KEY columns, so ids are INTEGER there and BIGINT on SQL Server
+BigIntegerPK = BigInteger().with_variant(Integer, 'sqlite')
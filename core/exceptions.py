@@ -15,3 +15,7 @@ class FilterFieldNotAllowed(Exception):
 
 class FilterOperationNotAllowed(Exception):
     ...
+
+
+class InvalidCursor(Exception):
+    ...
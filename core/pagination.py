@@ -0,0 +1,27 @@
+# Opaque cursors for keyset pagination.
+# A cursor holds the sort key of the last row of a page, the next page starts right after it.
+
+import base64
+import binascii
+import json
+from typing import Any, List
+from core.exceptions import InvalidCursor
+
+
+def encode_cursor(values: List[Any]) -> str:
+    data = json.dumps(values, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Returns the sort key stored in the cursor, `size` is the number of values the caller expects
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor
+    return values
@@ -1,14 +1,23 @@
-from typing import Dict, Set, Tuple, Any, Union, Callable, TypeVar, Generic
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Set, Tuple, Any, Union, Callable, TypeVar, Generic
 from pydantic import BaseModel
-from sqlalchemy import select, and_, or_, inspect
+from sqlalchemy import select, insert, update, delete, and_, or_, true, inspect, bindparam, literal
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.selectable import Select
-from sqlalchemy.sql.elements import BinaryExpression
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import NoResultFound, IntegrityError
 from core.database import Base
-from core.exceptions import InstanceNotFound, ConstraintsViolation, FilterFieldNotAllowed, FilterOperationNotAllowed
-from core.schemas import OPERATOR_MAP, Filter
+from core.exceptions import InstanceNotFound, ConstraintsViolation, FilterFieldNotAllowed, FilterOperationNotAllowed, InvalidCursor
+from core.pagination import encode_cursor, decode_cursor
+from core.schemas import (
+    OPERATOR_MAP,
+    VALUELESS_OPERATORS,
+    LIST_OPERATORS,
+    RANGE_OPERATORS,
+    Filter,
+    LogicalFilter
+)
 
 
 ModelType = TypeVar("ModelType", bound=Base)
@@ -16,6 +25,14 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 OperatorFunc = Callable[[Any, Any], BinaryExpression]
 
+FILTER_PLANS_CACHE_SIZE = 512
+
+# Prebuilt filter expressions keyed by (repository, filter shape), the shape contains no values
+_filter_plans: OrderedDict[tuple, Tuple[BinaryExpression, frozenset[str]]] = OrderedDict()
+_filter_plans_stats = {'hits': 0, 'misses': 0}
+# Relationships of each model in format {name: attribute}
+_relationships: Dict[type, Dict[str, Any]] = {}
+
 
 class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     """
@@ -29,8 +46,8 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
-    async def _select(self, stmt: Select):
-        return await self.session.execute(stmt)
+    async def _select(self, stmt: Select, params: Dict[str, Any]=None):
+        return await self.session.execute(stmt, params)
     
     async def _flush(self) -> None:
         try:
@@ -38,18 +55,51 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         except IntegrityError:
             raise ConstraintsViolation 
 
-    def _build_filter(self, filter_def: Filter) -> Tuple[BinaryExpression, set[str]]:
+    @classmethod
+    def filter_cache_info(cls) -> Dict[str, int]:
+        return {**_filter_plans_stats, 'size': len(_filter_plans)}
+
+    @staticmethod
+    def _filter_shape(node: Any, values: List[Any]) -> tuple:
+        """
+        Describes the filter tree without values (fields, operators, nesting and value types),
+        collecting values in order
+        """
+        if isinstance(node, list):
+            return ('and', tuple(BaseRepository._filter_shape(c, values) for c in node))
+        if isinstance(node, LogicalFilter):
+            if node.and_ is not None:
+                return ('and', tuple(BaseRepository._filter_shape(c, values) for c in node.and_))
+            return ('or', tuple(BaseRepository._filter_shape(c, values) for c in node.or_ or []))
+        op = node.op.lower()
+        if op in VALUELESS_OPERATORS or node.value is None:
+            # No parameters, `= None` is rendered as IS NULL like without the cache
+            return ('cond', node.field, op, None)
+        if op in LIST_OPERATORS:
+            values.append(list(node.value))
+            return ('cond', node.field, op, 'list')
+        if op in RANGE_OPERATORS:
+            values.extend(node.value)
+            return ('cond', node.field, op, tuple(type(v) for v in node.value))
+        values.append(node.value)
+        return ('cond', node.field, op, type(node.value))
+
+    def _build_filter_plan(self, shape: tuple, values: List[Any]) -> Tuple[BinaryExpression, frozenset[str]]:
         joins: set[str] = set()
+        params = iter(enumerate(values))
 
-        def _parse_condition(cond: dict) -> BinaryExpression:
-            if "and_" in cond:
-                return and_(*[_parse_condition(c) for c in cond["and_"]])
-            elif "or_" in cond:
-                return or_(*[_parse_condition(c) for c in cond["or_"]])
+        def _param() -> BindParameter:
+            # Bind parameter typed by the value like a plain literal would be
+            i, value = next(params)
+            return bindparam(f'flt_{i}', type_=literal(value).type)
+
+        def _parse_condition(node: tuple) -> BinaryExpression:
+            if node[0] == 'and':
+                return and_(*[_parse_condition(c) for c in node[1]])
+            elif node[0] == 'or':
+                return or_(*[_parse_condition(c) for c in node[1]])
             else:
-                field_name = cond["field"]
-                op = cond["op"].lower()
-                value = cond.get("value")
+                _, field_name, op, value_type = node
 
                 if field_name not in self.allowed_fields:
                     raise FilterFieldNotAllowed(f"Field '{field_name}' is not allowed.")
@@ -59,14 +109,39 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 column, join_key = self.allowed_fields[field_name]
                 if join_key:
                     joins.add(join_key)
+                if value_type is None:
+                    value = None
+                elif value_type == 'list':
+                    i, _ = next(params)
+                    value = bindparam(f'flt_{i}', expanding=True)
+                elif isinstance(value_type, tuple):
+                    value = (_param(), _param())
+                else:
+                    value = _param()
                 return self.allowed_ops[op](column, value)
 
-        filter_ = filter_def.model_dump()
-        if isinstance(filter_, list):
-            expr = and_(*[_parse_condition(f) for f in filter_])
+        return _parse_condition(shape), frozenset(joins)
+
+    def _build_filter(self, filter_def: Filter) -> Tuple[BinaryExpression, set[str], Dict[str, Any]]:
+        """
+        Returns where clause with bind parameters, required joins and parameters' values.
+        Where clauses are cached by the filter's shape, so repeated shapes cost only parameter binding.
+        Pass the parameters to self._select along with the statement.
+        """
+        values = []
+        shape = self._filter_shape(filter_def.root, values)
+        key = (type(self), shape)
+        plan = _filter_plans.get(key)
+        if plan is None:
+            _filter_plans_stats['misses'] += 1
+            plan = _filter_plans[key] = self._build_filter_plan(shape, values)
+            if len(_filter_plans) > FILTER_PLANS_CACHE_SIZE:
+                _filter_plans.popitem(last=False)
         else:
-            expr = _parse_condition(filter_)
-        return expr, joins
+            _filter_plans_stats['hits'] += 1
+            _filter_plans.move_to_end(key)
+        expr, joins = plan
+        return expr, set(joins), {f'flt_{i}': value for i, value in enumerate(values)}
 
     def _apply_joins(self, stmt, joins: Set[str], preload_related: bool):
         relationships = self._get_relationships()
@@ -81,20 +156,24 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return stmt
 
     def _get_relationships(self) -> Dict[str, Any]:
-        """Получает все отношения модели в формате {имя: атрибут}"""
-        mapper = inspect(self.model)
-        return {
-            rel.key: getattr(self.model, rel.key)  # Используем сам атрибут модели
-            for rel in mapper.relationships
-        }
+        """Получает все отношения модели в формате {имя: атрибут}, вычисляется один раз на модель"""
+        relationships = _relationships.get(self.model)
+        if relationships is None:
+            mapper = inspect(self.model)
+            relationships = _relationships[self.model] = {
+                rel.key: getattr(self.model, rel.key)  # Используем сам атрибут модели
+                for rel in mapper.relationships
+            }
+        return relationships
 
     async def get(self, id: int, filters: Filter=None) -> ModelType:
         stmt = select(self.model).where(self.model.id==id)
+        params = None
         if filters:
-            where_clause, joins = self._build_filter(filters)
+            where_clause, joins, params = self._build_filter(filters)
             stmt = self._apply_joins(stmt, joins, False)
             stmt = stmt.where(where_clause)
-        result = await self._select(stmt)
+        result = await self._select(stmt, params)
         try:
             return result.scalar_one()
         except NoResultFound:
@@ -105,19 +184,93 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             .order_by(self.model.id.desc()) \
             .limit(limit) \
             .offset(offset)
+        params = None
         if filters:
-            where_clause, joins = self._build_filter(filters)
+            where_clause, joins, params = self._build_filter(filters)
             stmt = self._apply_joins(stmt, joins, False)
             stmt = stmt.where(where_clause)
-        results = await self._select(stmt)
+        results = await self._select(stmt, params)
         return results.scalars().all()
 
+    async def list_page(self, limit: int=10, filters: Filter=None, cursor: str=None) -> Tuple[List[ModelType], Union[str, None]]:
+        """
+        Keyset pagination ordered by id desc. Returns the page and the cursor of the next page (None on the last page).
+        Unlike offset, every page costs the same and rows inserted meanwhile don't shift the pages.
+        """
+        stmt = select(self.model) \
+            .order_by(self.model.id.desc()) \
+            .limit(limit + 1)
+        params = None
+        if cursor:
+            last_id, = decode_cursor(cursor, 1)
+            if not isinstance(last_id, int):
+                raise InvalidCursor
+            stmt = stmt.where(self.model.id < last_id)
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
+            stmt = self._apply_joins(stmt, joins, False)
+            stmt = stmt.where(where_clause)
+        results = await self._select(stmt, params)
+        items = results.scalars().all()
+        if len(items) <= limit:
+            return items, None
+        items = items[:limit]
+        return items, encode_cursor([items[-1].id])
+
+    async def _stream(self, stmt: Select, params: Dict[str, Any]=None, batch_size: int=500) -> AsyncIterator[List[Any]]:
+        """
+        Executes the statement with a server side cursor and yields rows in batches of batch_size.
+        Yielded instances are expunged from the session, so memory is bounded by a single batch.
+        """
+        result = await self.session.stream(stmt.execution_options(yield_per=batch_size), params)
+        try:
+            async for partition in result.scalars().partitions():
+                yield partition
+                for instance in partition:
+                    self.session.expunge(instance)
+        finally:
+            await result.close()
+
+    async def stream(self, filters: Filter=None, batch_size: int=500) -> AsyncIterator[List[ModelType]]:
+        """
+        Walks all rows matching the filters ordered by id desc without loading them at once
+        """
+        stmt = select(self.model).order_by(self.model.id.desc())
+        params = None
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
+            stmt = self._apply_joins(stmt, joins, False)
+            stmt = stmt.where(where_clause)
+        async for batch in self._stream(stmt, params, batch_size):
+            yield batch
+
     async def create(self, item_data: CreateSchemaType) -> ModelType:
         instance = self.model(**item_data.model_dump(exclude_none=True))
         self.session.add(instance)
         await self._flush()
         return instance
 
+    async def create_many(self, items: List[CreateSchemaType]) -> List[ModelType]:
+        """
+        Inserts all items with one executemany INSERT ... OUTPUT/RETURNING, instances are returned in items' order.
+        Dialects that can't return rows of executemany in order get a single flush instead
+        """
+        rows = [item.model_dump(exclude_none=True) for item in items]
+        if not rows:
+            return []
+        dialect = self.session.get_bind().dialect
+        try:
+            if dialect.insert_executemany_returning_sort_by_parameter_order:
+                stmt = insert(self.model).returning(self.model, sort_by_parameter_order=True)
+                result = await self.session.execute(stmt, rows)
+                return result.scalars().all()
+            instances = [self.model(**row) for row in rows]
+            self.session.add_all(instances)
+            await self.session.flush()
+            return instances
+        except IntegrityError:
+            raise ConstraintsViolation
+
     async def update(self, id: int, item_data: UpdateSchemaType, filters: Filter=None) -> ModelType:
         instance = await self.get(id=id, filters=filters)
         for attr, value in item_data.model_dump(exclude_none=True).items():
@@ -129,3 +282,65 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     async def delete(self, id: int, filters: Filter=None) -> None:
         instance = await self.get(id=id, filters=filters)
         await self.session.delete(instance)
+
+    def _where(self, id: int=None, filters: Filter=None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Where clause of set-based statements. UPDATE/DELETE can't join portably,
+        so filters on related tables are applied through `id IN (SELECT ...)`
+        """
+        clauses, params = [], {}
+        if id is not None:
+            clauses.append(self.model.id==id)
+        if filters:
+            where_clause, joins, params = self._build_filter(filters)
+            if joins:
+                subquery = self._apply_joins(select(self.model.id), joins, False).where(where_clause)
+                clauses.append(self.model.id.in_(subquery))
+            else:
+                clauses.append(where_clause)
+        return and_(true(), *clauses), params
+
+    async def update_where(
+        self,
+        item_data: Union[UpdateSchemaType, Dict[str, Any]],
+        id: int=None,
+        filters: Filter=None,
+        returning: bool=False
+    ) -> Union[int, List[ModelType]]:
+        """
+        Updates matching rows with a single UPDATE statement.
+        Returns the number of affected rows, or the updated instances (OUTPUT/RETURNING) if returning is set
+        """
+        values = item_data if isinstance(item_data, dict) else item_data.model_dump(exclude_none=True)
+        where_clause, params = self._where(id=id, filters=filters)
+        if not values:
+            if returning:
+                return (await self._select(select(self.model).where(where_clause), params)).scalars().all()
+            return 0
+        stmt = update(self.model) \
+            .where(where_clause) \
+            .values(**values) \
+            .execution_options(synchronize_session='fetch')
+        if returning:
+            stmt = stmt.returning(self.model)
+        try:
+            result = await self.session.execute(stmt, params)
+        except IntegrityError:
+            raise ConstraintsViolation
+        return result.scalars().all() if returning else result.rowcount
+
+    async def delete_where(self, id: int=None, filters: Filter=None, returning: bool=False) -> Union[int, List[ModelType]]:
+        """
+        Deletes matching rows with a single DELETE statement, returns affected rows' count or the deleted instances
+        """
+        where_clause, params = self._where(id=id, filters=filters)
+        stmt = delete(self.model) \
+            .where(where_clause) \
+            .execution_options(synchronize_session='fetch')
+        if returning:
+            stmt = stmt.returning(self.model)
+        try:
+            result = await self.session.execute(stmt, params)
+        except IntegrityError:
+            raise ConstraintsViolation
+        return result.scalars().all() if returning else result.rowcount
@@ -1,4 +1,4 @@
-from typing import List, Any, Union, Literal, Optional
+from typing import List, Any, Union, Literal, Optional, TypeVar, Generic
 from pydantic import BaseModel, RootModel, Field, field_validator
 from sqlalchemy.sql import operators
 
@@ -25,6 +25,11 @@ OPERATOR_MAP = {
     'false': lambda col, _: col.is_(False)
 }
 
+# Operators grouped by the value they take, used to build bind parameters for filters
+VALUELESS_OPERATORS = {'is null', 'is not null', 'true', 'false'}
+LIST_OPERATORS = {'in', 'not in'}
+RANGE_OPERATORS = {'between'}
+
 
 class SimpleCondition(BaseModel):
     field: str
@@ -62,3 +67,32 @@ class Filter(RootModel[Union[List[SimpleCondition], LogicalFilter]]):
         if isinstance(self.root, list):
             return LogicalFilter(and_=self.root)
         return self.root
+
+    @property
+    def fields(self) -> set[str]:
+        """
+        All fields the filter refers to, at any depth
+        """
+        fields, nodes = set(), [self.root]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, list):
+                nodes.extend(node)
+            elif isinstance(node, LogicalFilter):
+                nodes.extend((node.and_ or []) + (node.or_ or []))
+            else:
+                fields.add(node.field)
+        return fields
+
+
+
+ItemType = TypeVar("ItemType")
+
+
+class Page(BaseModel, Generic[ItemType]):
+    """
+    A page of keyset pagination, pass next_cursor back to get the following page.
+    next_cursor is None on the last page.
+    """
+    items: List[ItemType]
+    next_cursor: Optional[str] = None
@@ -1,26 +1,52 @@
-from typing import Dict
-from sqlalchemy.ext.asyncio import AsyncSession
+from contextvars import ContextVar
+from typing import Any, Dict, Tuple, Type
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from core.repositories import BaseRepository
 
 
 class UnitOfWork:
-    def __init__(self, session: AsyncSession, repositories: Dict[str, BaseRepository] = None) -> None:
+    """
+    One UnitOfWork instance can be shared between handlers and tool calls.
+    Every `async with uow` opens its own session and repositories and keeps them
+    in a context variable, so concurrent tasks never see each other's session.
+    Nested `async with` blocks in the same task get their own scope as well.
+    """
+    def __init__(self, session: async_sessionmaker[AsyncSession], repositories: Dict[str, Type[BaseRepository]] = None) -> None:
         self.session_factory = session
         self.repositories = repositories or {}
+        self._scopes: ContextVar[Tuple[Dict[str, Any], ...]] = ContextVar(f'uow_scopes_{id(self)}', default=())
 
-    def add_repository(self, label: str, repository: BaseRepository) -> None:
+    def add_repository(self, label: str, repository: Type[BaseRepository]) -> None:
         self.repositories[label] = repository
 
+    def _current_scope(self) -> Dict[str, Any]:
+        scopes = self._scopes.get()
+        if not scopes:
+            raise RuntimeError("UnitOfWork is used outside of `async with` block")
+        return scopes[-1]
+
+    def __getattr__(self, name: str) -> Any:
+        # Called only for attributes that are not set on the instance: session and repositories
+        if name == 'session' or name in self.__dict__.get('repositories', {}):
+            return self._current_scope()[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
     async def __aenter__(self):
-        async with self.session_factory() as session:
-            self.session = session
-            for label, repository in self.repositories.items():
-                setattr(self, label, repository(session))
-            return self
-        
+        session = self.session_factory()
+        scope = {'session': session}
+        for label, repository in self.repositories.items():
+            scope[label] = repository(session)
+        self._scopes.set(self._scopes.get() + (scope, ))
+        return self
+
     async def __aexit__(self, *args):
-        await self.session.rollback()
-        await self.session.close()
+        scopes = self._scopes.get()
+        session = scopes[-1]['session']
+        self._scopes.set(scopes[:-1])
+        try:
+            await session.rollback()
+        finally:
+            await session.close()
 
     async def commit(self) -> None:
         await self.session.commit()
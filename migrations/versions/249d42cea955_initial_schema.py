@@ -0,0 +1,129 @@
+"""initial schema
+
+Tables as they were created before migrations were introduced,
+an existing database is brought under migrations with `alembic stamp 249d42cea955`.
+
+Revision ID: 249d42cea955
+Revises: 
+Create Date: 2026-10-16 22:40:28.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '249d42cea955'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('telegram_id')
+    )
+    op.create_table(
+        'transaction_types',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('type_name', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'currencies',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('iso_code', sa.String(length=10), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('iso_code')
+    )
+    op.create_table(
+        'tg_messages',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('code', sa.String(length=255), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('code')
+    )
+    op.create_table(
+        'accounts',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('balance', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'name', name='uq_user_account_name')
+    )
+    op.create_table(
+        'categories',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'vendors',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'items',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('category_id', sa.BigInteger(), nullable=False),
+        sa.Column('vendor_id', sa.BigInteger(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='NO ACTION'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ondelete='NO ACTION'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'transactions',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('type_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.BigInteger(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('amount_in_account_currency', sa.Float(), nullable=False),
+        sa.Column('transaction_date', sa.Date(), server_default=sa.func.current_date(), nullable=True),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('reference_transaction_id', sa.BigInteger(), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ondelete='NO ACTION'),
+        sa.ForeignKeyConstraint(['reference_transaction_id'], ['transactions.id']),
+        sa.ForeignKeyConstraint(['type_id'], ['transaction_types.id'], ondelete='NO ACTION'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('transactions')
+    op.drop_table('items')
+    op.drop_table('vendors')
+    op.drop_table('categories')
+    op.drop_table('accounts')
+    op.drop_table('tg_messages')
+    op.drop_table('currencies')
+    op.drop_table('transaction_types')
+    op.drop_table('users')
@@ -0,0 +1,58 @@
+"""transactions archive
+
+Soft-deleted transactions are moved to transactions_archive by the archiver,
+filtered indexes find them in the transactions table until then.
+
+Revision ID: 63b1d57979d1
+Revises: 9fb54b67b7ac
+Create Date: 2026-10-16 22:40:28.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '63b1d57979d1'
+down_revision: Union[str, None] = '9fb54b67b7ac'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'transactions_archive',
+        sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('type_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.BigInteger(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('amount_in_account_currency', sa.Float(), nullable=False),
+        sa.Column('transaction_date', sa.Date(), nullable=True),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('reference_transaction_id', sa.BigInteger(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ondelete='NO ACTION'),
+        sa.ForeignKeyConstraint(['type_id'], ['transaction_types.id'], ondelete='NO ACTION'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_transactions_archive_account_deleted_at', 'transactions_archive', ['account_id', 'deleted_at'])
+    op.create_index(
+        'ix_transactions_account_deleted_at',
+        'transactions',
+        ['account_id', sa.text('deleted_at DESC')],
+        mssql_where=sa.text('is_deleted = 1')
+    )
+    op.create_index('ix_transactions_deleted_at', 'transactions', ['deleted_at'], mssql_where=sa.text('is_deleted = 1'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_deleted_at', table_name='transactions')
+    op.drop_index('ix_transactions_account_deleted_at', table_name='transactions')
+    op.drop_index('ix_transactions_archive_account_deleted_at', table_name='transactions_archive')
+    op.drop_table('transactions_archive')
@@ -0,0 +1,43 @@
+"""access path indexes
+
+Indexes for the hot queries: transactions of an account in (transaction_date, id) desc order
+without soft-deleted rows, accounts by user, transfer legs by reference and fx rates history.
+tg_messages.code and the rollup lookups are already served by their unique constraints.
+
+Revision ID: 9fb54b67b7ac
+Revises: d692cfdadc1a
+Create Date: 2026-10-16 22:40:28.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9fb54b67b7ac'
+down_revision: Union[str, None] = 'd692cfdadc1a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_transactions_account_date',
+        'transactions',
+        ['account_id', sa.text('transaction_date DESC'), sa.text('id DESC')],
+        mssql_where=sa.text('is_deleted = 0')
+    )
+    op.create_index('ix_transactions_reference_transaction_id', 'transactions', ['reference_transaction_id'])
+    op.create_index('ix_accounts_user_id', 'accounts', ['user_id'], mssql_include=['currency', 'balance'])
+    op.create_index('ix_fx_rates_currency_date', 'fx_rates', ['currency', 'rate_date'], mssql_include=['rate'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_fx_rates_currency_date', table_name='fx_rates')
+    op.drop_index('ix_accounts_user_id', table_name='accounts')
+    op.drop_index('ix_transactions_reference_transaction_id', table_name='transactions')
+    op.drop_index('ix_transactions_account_date', table_name='transactions')
@@ -0,0 +1,58 @@
+"""backfill transaction rollups
+
+transaction_rollups was created empty, while summaries by type, account, day and month
+are answered from it. The rollups are recomputed from the transactions here,
+the same way `python -m budget.commands rebuild-rollups` does.
+
+Revision ID: b4e1c7a92f3d
+Revises: 63b1d57979d1
+Create Date: 2026-10-17 10:12:45.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e1c7a92f3d'
+down_revision: Union[str, None] = '63b1d57979d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# First day of the period, see budget.repositories.period_start
+PERIOD_STARTS = {
+    'mssql': {
+        'day': 'transaction_date',
+        'month': 'DATEFROMPARTS(YEAR(transaction_date), MONTH(transaction_date), 1)',
+    },
+    'sqlite': {
+        'day': 'transaction_date',
+        'month': "strftime('%Y-%m-01', transaction_date)",
+    },
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    period_starts = PERIOD_STARTS[op.get_bind().dialect.name]
+    op.execute('DELETE FROM transaction_rollups')
+    for period, start in period_starts.items():
+        op.execute(sa.text(f"""
+            INSERT INTO transaction_rollups (account_id, period, period_start, type_id, total, count)
+            SELECT account_id, :period, period_start, type_id, SUM(amount_in_account_currency), COUNT(id)
+            FROM (
+                SELECT account_id, {start} AS period_start, type_id, id, amount_in_account_currency
+                FROM transactions
+                WHERE is_deleted = 0 AND transaction_date IS NOT NULL
+            ) AS ledger
+            GROUP BY account_id, period_start, type_id
+        """).bindparams(period=period))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The rollups stay, the application keeps them up to date
+    pass
@@ -0,0 +1,51 @@
+"""fx rates and transaction rollups
+
+Revision ID: d692cfdadc1a
+Revises: 249d42cea955
+Create Date: 2026-10-16 22:40:28.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd692cfdadc1a'
+down_revision: Union[str, None] = '249d42cea955'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'fx_rates',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('rate_date', sa.Date(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('rate_date', 'currency', name='uq_fx_rate_date_currency')
+    )
+    op.create_table(
+        'transaction_rollups',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('account_id', sa.BigInteger(), nullable=False),
+        sa.Column('period', sa.String(length=5), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('type_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['type_id'], ['transaction_types.id'], ondelete='NO ACTION'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'period', 'period_start', 'type_id', name='uq_transaction_rollup')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('transaction_rollups')
+    op.drop_table('fx_rates')
@@ -0,0 +1,86 @@
+import pytest
+from types import SimpleNamespace
+from sqlalchemy.dialects import mssql
+from aiclient import ai_client, tools
+from aiclient.ai_client import Client
+from budget.schemas import UserReadSchema
+from budget.repositories import AccountRepository
+
+
+ACCOUNTS = [{'id': 1, 'name': 'Kaspi', 'currency': 'KZT', 'balance': 1500.}]
+
+
+@pytest.fixture(autouse=True)
+def accounts_snapshot(monkeypatch):
+    async def get_accounts_snapshot(user_id: int) -> list[dict]:
+        return ACCOUNTS
+    monkeypatch.setattr(ai_client, 'get_accounts_snapshot', get_accounts_snapshot)
+
+
+@pytest.fixture
+def user():
+    return UserReadSchema(id=1, name='test', telegram_id=123123)
+
+
+@pytest.mark.asyncio
+async def test_refresh_accounts_updates_context_message(user):
+    client = Client('prompt', {'user': user, 'date': '2025-05-01'})
+    client.add_message({"role": "user", "content": "question"})
+    await client.refresh_accounts()
+
+    assert client.pinned_messages == 2
+    assert client.messages[0] == {"role": "system", "content": "prompt"}
+    assert 'Kaspi' in client.messages[1]["content"]
+    assert client.messages[2] == {"role": "user", "content": "question"}
+
+
+@pytest.mark.asyncio
+async def test_refresh_accounts_inserts_context_message(user):
+    client = Client('prompt')
+    client.add_message({"role": "user", "content": "question"})
+    client.context.update({'user': user, 'date': '2025-05-01'})
+    await client.refresh_accounts()
+
+    assert client.pinned_messages == 2
+    assert 'Kaspi' in client.messages[1]["content"]
+    assert client.messages[2] == {"role": "user", "content": "question"}
+
+
+@pytest.mark.asyncio
+async def test_refresh_accounts_without_context():
+    client = Client('prompt')
+    client.add_message({"role": "user", "content": "question"})
+    await client.refresh_accounts()
+    assert client.messages == [{"role": "system", "content": "prompt"}, {"role": "user", "content": "question"}]
+
+
+class RecordingSession:
+    def __init__(self) -> None:
+        self.statements = []
+
+    async def execute(self, stmt, params=None):
+        self.statements.append(stmt)
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: []))
+
+
+class FakeUnitOfWork:
+    def __init__(self, session: RecordingSession) -> None:
+        self.accounts = AccountRepository(session)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_accounts_snapshot_query_compiles_on_mssql(monkeypatch):
+    session = RecordingSession()
+    monkeypatch.setattr(tools, 'uow', FakeUnitOfWork(session))
+    assert await tools.get_accounts_snapshot(user_id=1) == []
+
+    [stmt] = session.statements
+    sql = str(stmt.compile(dialect=mssql.dialect()))
+    assert 'accounts.is_active = ' in sql
+    assert ' IS 1' not in sql
@@ -0,0 +1,12 @@
+import pytest
+from aiclient.confirmations import render_confirmation
+
+
+@pytest.mark.parametrize("result, confirmation", [
+    ({"status": "deleted"}, 'Удалила транзакцию #7'),
+    ({"status": "Transaction not found"}, None),
+    ({"status": "Some error occurred. The team is already looking into it."}, None),
+    (None, None),
+])
+def test_delete_transaction_confirmation(result, confirmation):
+    assert render_confirmation('delete_transaction', '{"account_id": 1, "transaction_id": 7}', result) == confirmation
@@ -0,0 +1,43 @@
+import datetime
+import pytest
+from budget.conversion import RateTable
+from budget.exceptions import CurrencyRateNotFound
+
+
+RATES = RateTable([
+    ('USD', datetime.date(2025, 5, 1), 500.),
+    ('USD', datetime.date(2025, 5, 10), 510.),
+    ('EUR', datetime.date(2025, 5, 1), 560.),
+    ('RUB', datetime.date(2025, 5, 5), 6.),
+])
+
+
+def test_convert_as_of_date():
+    converted = RATES.convert(
+        amounts=[1., 1., 1., 100., 1000.],
+        currencies=['USD', 'USD', 'EUR', 'RUB', 'KZT'],
+        dates=[datetime.date(2025, 5, 1), datetime.date(2025, 5, 20), datetime.date(2025, 5, 9), datetime.date(2025, 5, 5), datetime.date(2025, 1, 1)],
+        base_currency='KZT'
+    )
+    assert converted.tolist() == [500., 510., 560., 600., 1000.]
+
+
+def test_convert_to_other_currency():
+    converted = RATES.convert(
+        amounts=[560., 1.],
+        currencies=['KZT', 'EUR'],
+        dates=[datetime.date(2025, 5, 2)] * 2,
+        base_currency='EUR'
+    )
+    assert converted.tolist() == [1., 1.]
+
+
+def test_convert_without_rate():
+    with pytest.raises(CurrencyRateNotFound):
+        RATES.convert([1.], ['GBP'], [datetime.date(2025, 5, 1)], 'KZT')
+    # RUB has no rate before 2025-05-05
+    with pytest.raises(CurrencyRateNotFound):
+        RATES.convert([1.], ['RUB'], [datetime.date(2025, 5, 4)], 'KZT')
+    # Rows don't take another currency's rate
+    with pytest.raises(CurrencyRateNotFound):
+        RATES.convert([1.], ['USD'], [datetime.date(2025, 4, 1)], 'KZT')
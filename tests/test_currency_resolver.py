@@ -0,0 +1,95 @@
+import os
+import time
+import pytest
+from thefuzz import process, fuzz
+from budget.schemas import CurrencyReadSchema
+from budget.currencies import CurrencyResolver
+
+
+CURRENCIES = [
+    CurrencyReadSchema(iso_code=iso_code, name=name)
+    for iso_code, name in [
+        ('KZT', 'Казахстанский тенге'), ('USD', 'Доллар США'), ('EUR', 'Евро'), ('RUB', 'Российский рубль'),
+        ('GBP', 'Фунт стерлингов'), ('CNY', 'Китайский юань'), ('JPY', 'Японская иена'), ('CHF', 'Швейцарский франк'),
+        ('KGS', 'Киргизский сом'), ('UZS', 'Узбекский сум'), ('TRY', 'Турецкая лира'), ('AED', 'Дирхам ОАЭ'),
+        ('BYN', 'Белорусский рубль'), ('UAH', 'Украинская гривна'), ('GEL', 'Грузинский лари'), ('AMD', 'Армянский драм'),
+        ('AZN', 'Азербайджанский манат'), ('TJS', 'Таджикский сомони'), ('INR', 'Индийская рупия'), ('KRW', 'Вон Республики Корея'),
+        ('CAD', 'Канадский доллар'), ('AUD', 'Австралийский доллар'), ('SEK', 'Шведская крона'), ('NOK', 'Норвежская крона'),
+        ('DKK', 'Датская крона'), ('PLN', 'Польский злотый'), ('CZK', 'Чешская крона'), ('HKD', 'Гонконгский доллар'),
+        ('SGD', 'Сингапурский доллар'), ('THB', 'Тайский бат'), ('MYR', 'Малайзийский ринггит'), ('BRL', 'Бразильский реал'),
+        ('ZAR', 'Южноафриканский рэнд'), ('SAR', 'Саудовский риял'), ('IRR', 'Иранский риал'), ('MNT', 'Монгольский тугрик'),
+    ]
+]
+
+RUN_BENCHMARKS = os.getenv('RUN_BENCHMARKS', '').lower() in ('1', 'true')
+
+QUERIES = ['тенге', 'Казахстанский', 'usd', 'доллар', 'евро', 'рубль', 'юань', 'лира', 'крона', 'злотый', 'Сингапурский', 'Тайский бат']
+
+
+def legacy_find_currency(name: str) -> CurrencyReadSchema | None:
+    # AccountService.find_currency before the resolver
+    choices = [f'{c.iso_code.upper()}:{c.name.upper()}' for c in CURRENCIES]
+    similarities = process.extract(name.strip().upper(), choices, scorer=fuzz.partial_token_sort_ratio, limit=1)
+    currency, prob = similarities[0]
+    if prob <= 50:
+        return None
+    iso_code, _ = currency.split(':')
+    currency = [f"{c.name}" for c in CURRENCIES if c.iso_code==iso_code][0]
+    return CurrencyReadSchema(name=currency, iso_code=iso_code)
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return CurrencyResolver(CURRENCIES)
+
+
+@pytest.mark.parametrize("name, iso_code", [
+    ('KZT', 'KZT'),
+    ('kzt', 'KZT'),
+    ('тенге', 'KZT'),
+    ('₸', 'KZT'),
+    ('$', 'USD'),
+    ('Долларов', 'USD'),
+    ('Казахстанский тенге', 'KZT'),
+    ('японская иена', 'JPY'),
+    ('швейцарский франк', 'CHF'),
+    ('грузинский', 'GEL'),
+])
+def test_resolve(resolver, name, iso_code):
+    assert resolver.resolve(name).iso_code == iso_code
+
+
+def test_resolve_not_found(resolver):
+    assert resolver.resolve('') is None
+    assert resolver.resolve('qwxz') is None
+    assert CurrencyResolver([]).resolve('тенге') is None
+
+
+def test_resolve_matches_legacy(resolver):
+    for name in QUERIES:
+        legacy = legacy_find_currency(name)
+        # Aliases may resolve queries the fuzzy search matched to another currency with the same score
+        if name.lower() in resolver.aliases:
+            continue
+        assert resolver.resolve(name) == legacy, name
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(not RUN_BENCHMARKS, reason='Timing comparison, set RUN_BENCHMARKS=1 to run it')
+def test_resolve_benchmark(resolver):
+    rounds = 50
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for name in QUERIES:
+            legacy_find_currency(name)
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        resolved = [resolver.resolve(name) for name in QUERIES]
+    resolver_seconds = time.perf_counter() - started
+
+    # Timings depend on the machine and its load, they are reported, not asserted
+    print(f'\nfind_currency legacy: {legacy_seconds:.4f}s, resolver: {resolver_seconds:.4f}s '
+          f'({legacy_seconds / resolver_seconds:.1f}x) for {rounds * len(QUERIES)} lookups')
+    assert all(currency is not None for currency in resolved)
@@ -0,0 +1,88 @@
+import datetime
+import pytest
+from types import SimpleNamespace
+from budget.schemas import AccountReadSchema
+from aiclient.sessions import SessionRegistry
+from tg_bot.fast_path import FastPathStats, parse_transaction
+from tg_bot.handlers import stats
+
+
+def account(id: int, name: str, currency: str) -> AccountReadSchema:
+    return AccountReadSchema(
+        id=id, name=name, currency=currency, balance=0., created_at=datetime.datetime(2025, 5, 1), is_active=True
+    )
+
+
+ONE_KZT = [account(1, 'Kaspi', 'KZT')]
+ONE_USD = [account(2, 'Card', 'USD')]
+TWO = [account(1, 'Kaspi', 'KZT'), account(2, 'Card', 'USD')]
+
+
+@pytest.mark.parametrize("text, accounts, kind, amount, description, account_id", [
+    ('Spent 25 on groceries', ONE_USD, 'purchase', 25., 'Groceries', 2),
+    ('Потратила 300 тг на кофе с Kaspi', TWO, 'purchase', 300., 'Кофе', 1),
+    ('купил кофе за 1 500', ONE_KZT, 'purchase', 1500., 'Кофе', 1),
+    ('купил такси 2.5к', ONE_KZT, 'purchase', 2500., 'Такси', 1),
+    ('paid 12.50 for lunch from card', TWO, 'purchase', 12.5, 'Lunch', 2),
+    ('получил 5000 на Kaspi за фриланс', TWO, 'topup', 5000., 'Фриланс', 1),
+    ('Spent 25 on groceries in Kaspi store', ONE_KZT, 'purchase', 25., 'Groceries in kaspi store', 1),
+])
+def test_parse_hit(text, accounts, kind, amount, description, account_id):
+    parsed = parse_transaction(text, accounts)
+    assert parsed is not None
+    assert (parsed.kind, parsed.amount, parsed.description, parsed.account_id) == (kind, amount, description, account_id)
+
+
+@pytest.mark.parametrize("text, accounts", [
+    # Units and quantities are not amounts
+    ('купил 3 кг яблок', ONE_KZT),
+    ('купил 2 пиццы', ONE_KZT),
+    ('bought 2 coffees', ONE_USD),
+    # Payments to a person are transfers
+    ('paid 5000 to Ivan', ONE_USD),
+    ('paid to Ivan 5000', ONE_USD),
+    # The account name without a preposition is not an account mention
+    ('Spent 25 on groceries in Kaspi store', TWO),
+    ('got paid 5000', ONE_KZT),
+    ('потратил 300 тг на кофе', TWO),
+    ('spent 25 usd on lunch', ONE_KZT),
+    ('spent 25 on lunch yesterday', ONE_USD),
+    ('потратила 300 и 500 на кофе', ONE_KZT),
+    ('сколько я потратила?', ONE_KZT),
+])
+def test_parse_miss(text, accounts):
+    assert parse_transaction(text, accounts) is None
+
+
+def test_stats_report():
+    report = FastPathStats()
+    assert report.report() == {
+        'hits': 0, 'misses': 0, 'hit_rate': 0., 'avg_fast_path_seconds': 0., 'avg_ai_turn_seconds': 0., 'saved_seconds': 0.
+    }
+    report.record_hit(0.05)
+    report.record_hit(0.15)
+    report.record_miss()
+    report.record_ai_turn(2.)
+    report.record_ai_turn(4.)
+    assert report.report() == {
+        'hits': 2, 'misses': 1, 'hit_rate': 0.6667, 'avg_fast_path_seconds': 0.1, 'avg_ai_turn_seconds': 3., 'saved_seconds': 5.8
+    }
+
+
+@pytest.mark.asyncio
+async def test_stats_command_shows_fast_path(monkeypatch):
+    fast_path_stats = FastPathStats()
+    fast_path_stats.record_hit(0.1)
+    monkeypatch.setattr('tg_bot.handlers.fast_path_stats', fast_path_stats)
+
+    replies = []
+
+    async def reply_text(text: str) -> None:
+        replies.append(text)
+
+    update = SimpleNamespace(message=SimpleNamespace(reply_text=reply_text))
+    await stats(update, SimpleNamespace(bot_data={'ai_sessions': SessionRegistry()}))
+
+    [reply] = replies
+    assert 'AI sessions:' in reply and 'Prompt cache:' in reply
+    assert 'Fast path:\n  hits: 1\n  misses: 0\n  hit_rate: 1.0' in reply
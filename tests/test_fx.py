@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import pytest_asyncio
+from budget.fx import RateProvider
+from budget.exceptions import RatesUnavailable
+
+
+RATES_XML = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel>
+<item><title>USD</title><description>500.00</description><quant>1</quant></item>
+<item><title>EUR</title><description>550.00</description><quant>1</quant></item>
+<item><title>RUB</title><description>600.00</description><quant>100</quant></item>
+</channel></rss>
+"""
+
+
+class FeedStub:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.status = 200
+        self.delay = 0.
+
+
+@pytest.fixture
+def feed():
+    stub = FeedStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            stub.requests += 1
+            if stub.delay:
+                threading.Event().wait(stub.delay)
+            self.send_response(stub.status)
+            self.end_headers()
+            if stub.status == 200:
+                self.wfile.write(RATES_XML.encode())
+
+        def log_message(self, *args):
+            ...
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    stub.url = f'http://127.0.0.1:{server.server_address[1]}/rss/rates_all.xml'
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest_asyncio.fixture
+async def provider(feed):
+    provider = RateProvider(url=feed.url, ttl=60, timeout=5)
+    yield provider
+    await provider.stop()
+
+
+@pytest.mark.asyncio
+async def test_get_rate(provider):
+    assert await provider.get_rate('USD', 'KZT') == 500.
+    assert await provider.get_rate('EUR', 'USD') == 1.1
+    assert await provider.get_rate('RUB', 'KZT') == 6.
+
+
+@pytest.mark.asyncio
+async def test_rates_are_cached(provider, feed):
+    for _ in range(5):
+        await provider.get_rate('USD', 'KZT')
+    assert feed.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_download(provider, feed):
+    feed.delay = 0.2
+    rates = await asyncio.gather(*[provider.get_rate('USD', 'KZT') for _ in range(10)])
+    assert rates == [500.] * 10
+    assert feed.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_last_known_rates_on_failure(provider, feed):
+    await provider.get_rates()
+    provider.ttl = 0
+    feed.status = 500
+    assert await provider.get_rate('USD', 'KZT') == 500.
+    assert provider.stats['stale'] == 1
+
+
+@pytest.mark.asyncio
+async def test_rates_unavailable(provider, feed):
+    feed.status = 500
+    with pytest.raises(RatesUnavailable):
+        await provider.get_rates()
+
+
+@pytest.mark.asyncio
+async def test_background_refresher(provider, feed):
+    provider.ttl = 0.05
+    provider.start()
+    await asyncio.sleep(0.3)
+    await provider.stop()
+    assert provider.stats['downloads'] >= 2
@@ -0,0 +1,77 @@
+import pytest
+from aiclient.history import HistoryManager, SUMMARY_PREFIX
+
+
+SYSTEM = [{"role": "system", "content": "prompt"}, {"role": "system", "content": "context"}]
+
+
+def turn(n: int, tool_result: str = None) -> list[dict]:
+    messages = [{"role": "user", "content": f"question {n}"}]
+    if tool_result is not None:
+        messages += [
+            {"role": "assistant", "content": None, "tool_calls": [
+                {"id": f"call_{n}", "type": "function", "function": {"name": "list_accounts", "arguments": "{}"}}
+            ]},
+            {"role": "tool", "tool_call_id": f"call_{n}", "content": tool_result}
+        ]
+    return messages + [{"role": "assistant", "content": f"answer {n}"}]
+
+
+def conversation(*turns: list[dict]) -> list[dict]:
+    return SYSTEM + [message for turn in turns for message in turn]
+
+
+@pytest.mark.asyncio
+async def test_prune_within_budget():
+    messages = conversation(turn(1, 'x' * 1000), turn(2))
+    assert await HistoryManager(max_tokens=10000).prune(messages) is messages
+
+
+@pytest.mark.asyncio
+async def test_prune_compresses_old_tool_results():
+    messages = conversation(turn(1, 'x' * 3000), turn(2, 'y' * 3000), turn(3))
+    history = HistoryManager(max_tokens=HistoryManager._tokens(messages) - 1, tool_result_max_chars=100, keep_last_turns=2)
+    pruned = await history.prune(messages)
+
+    assert pruned[:2] == SYSTEM
+    tool_results = [message["content"] for message in pruned if message["role"] == "tool"]
+    # Only the turn outside of the last two is compressed
+    assert tool_results == ['x' * 100 + '... [truncated]', 'y' * 3000]
+    assert len(pruned) == len(messages)
+
+
+@pytest.mark.asyncio
+async def test_prune_drops_oldest_turns():
+    turns = [turn(n, 'x' * 300) for n in range(1, 6)]
+    budget = HistoryManager._tokens(SYSTEM + turns[3] + turns[4]) + 10
+    pruned = await HistoryManager(max_tokens=budget, tool_result_max_chars=100, keep_last_turns=2).prune(conversation(*turns))
+    assert pruned[:2] == SYSTEM
+    assert pruned[2]["content"] == 'question 4'
+    assert [message for message in pruned if message["role"] == "tool"][0]["content"] == 'x' * 300
+
+
+@pytest.mark.asyncio
+async def test_prune_keeps_last_turns_over_budget():
+    messages = conversation(turn(1), turn(2, 'x' * 3000), turn(3, 'y' * 3000))
+    pruned = await HistoryManager(max_tokens=10, keep_last_turns=2).prune(messages)
+    # The budget is still exceeded, but turns inside the keep_last_turns window are never dropped
+    assert pruned == conversation(turn(2, 'x' * 3000), turn(3, 'y' * 3000))
+
+
+@pytest.mark.asyncio
+async def test_prune_folds_dropped_turns_into_summary():
+    calls = []
+
+    async def summarizer(text: str, previous: str = None) -> str:
+        calls.append((text, previous))
+        return 'new summary'
+
+    messages = SYSTEM + [{"role": "system", "content": SUMMARY_PREFIX + 'old summary'}] \
+        + turn(1) + turn(2, 'x' * 3000) + turn(3)
+    pruned = await HistoryManager(max_tokens=10, keep_last_turns=1, summarizer=summarizer).prune(messages)
+
+    assert calls == [(
+        'user: question 1\nassistant: answer 1\nuser: question 2\nassistant: answer 2',
+        'old summary'
+    )]
+    assert pruned == SYSTEM + [{"role": "system", "content": SUMMARY_PREFIX + 'new summary'}] + turn(3)
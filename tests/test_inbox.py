@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from tg_bot.inbox import UserInbox
+
+
+@pytest.mark.asyncio
+async def test_burst_is_merged_into_one_turn():
+    inbox = UserInbox(window=0.01)
+    results = await asyncio.gather(*[inbox.collect(1, message) for message in ('first', 'second', 'third')])
+    assert results == [False, False, True]
+    async with inbox.turn(1):
+        assert inbox.drain(1) == 'first\nsecond\nthird'
+        assert inbox.drain(1) is None
+
+
+@pytest.mark.asyncio
+async def test_turns_of_one_user_never_overlap():
+    inbox = UserInbox(window=0)
+    running, concurrency, tasks = 0, [], []
+
+    async def turn(start_next: bool = False) -> None:
+        nonlocal running
+        async with inbox.turn(1):
+            running += 1
+            concurrency.append(running)
+            await asyncio.sleep(0.01)
+            running -= 1
+        if start_next:
+            # Starts while the waiting turn is handed the lock but hasn't taken it yet
+            tasks.append(asyncio.create_task(turn()))
+
+    first = asyncio.create_task(turn(start_next=True))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(turn())
+    await asyncio.gather(first, waiting)
+    await asyncio.gather(*tasks)
+
+    assert concurrency == [1, 1, 1]
+    # Idle users are forgotten
+    assert not inbox._locks and not inbox._lock_users
@@ -0,0 +1,183 @@
+import os
+import datetime
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+import pytest
+import pytest_asyncio
+from dotenv import dotenv_values
+from sqlalchemy import text, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.engine.url import URL
+from core.pagination import encode_cursor
+from budget.models import *
+from budget.uow import UnitOfWork
+from budget.repositories import AccountRepository, TransactionRepository, FxRateRepository, RollupRepository, TransactionArchiveRepository
+from budget.services import TransactionService
+
+
+# Plans of the main repository queries must reach these tables through an index seek, never a scan
+HOT_TABLES = {'transactions', 'accounts', 'fx_rates', 'transaction_rollups', 'transactions_archive'}
+
+SHOWPLAN_NS = '{http://schemas.microsoft.com/sqlserver/2004/07/showplan}'
+MSSQL_SCANS = {'Table Scan', 'Index Scan', 'Clustered Index Scan'}
+
+
+# ---------------- FIXTURES ---------------- #
+CONFIG = {**dotenv_values('env_test')}
+
+
+def database_url() -> str | URL:
+    """
+    The test SQL Server from env_test by default, TEST_DATABASE_URL points the test at another database,
+    e.g. sqlite+aiosqlite:///plans.db
+    """
+    url = os.getenv('TEST_DATABASE_URL') or CONFIG.get('TEST_DATABASE_URL')
+    if url:
+        return url
+    return URL.create(
+        "mssql+aioodbc",
+        username=CONFIG.get('DB_USERNAME'),
+        password=CONFIG.get('DB_PASSWORD'),
+        host=CONFIG.get('DB_HOSTNAME'),
+        database=CONFIG.get('DB_DATABASE'),
+        query={
+            "driver": "ODBC Driver 17 for SQL Server",
+            "autocommit": "False",
+            "trusted_connection": CONFIG.get('DB_TRUSTED_CONNECTION')
+        },
+    )
+
+
+@pytest_asyncio.fixture
+async def engine():
+    engine = create_async_engine(database_url(), echo=False)
+    if engine.dialect.name not in ('mssql', 'sqlite'):
+        pytest.skip(f'Plans are not captured on {engine.dialect.name}')
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def prepare_database(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("INSERT INTO users(name, telegram_id) VALUES ('test', 123123)"))
+        await conn.execute(text("""
+        INSERT INTO accounts(user_id, name, currency, balance, created_at, is_active)
+        VALUES (1, 'test account 1', 'USD', 1000., '2025-05-01', 1)
+        """))
+        await conn.execute(text("INSERT INTO transaction_types(type_name) VALUES ('Topup')"))
+        await conn.execute(text("""
+        INSERT INTO transactions(type_id, account_id, amount, currency, amount_in_account_currency, transaction_date, is_deleted)
+        VALUES (1, 1, 1000., 'USD', 1000., '2025-05-01', 0)
+        """))
+        await conn.execute(text("""
+        INSERT INTO transactions(type_id, account_id, amount, currency, amount_in_account_currency, transaction_date, is_deleted, deleted_at)
+        VALUES (1, 1, 10., 'USD', 10., '2025-05-01', 1, '2025-05-02')
+        """))
+        if engine.dialect.name == 'mssql':
+            # On a handful of rows a scan is the cheapest plan anyway, so the tables pretend to be big
+            for table in HOT_TABLES:
+                await conn.execute(text(f'UPDATE STATISTICS {table} WITH ROWCOUNT = 1000000, PAGECOUNT = 100000'))
+
+
+@pytest_asyncio.fixture
+async def uow(engine):
+    return UnitOfWork(
+        session=async_sessionmaker(bind=engine, expire_on_commit=False),
+        repositories={
+            'accounts': AccountRepository,
+            'transactions': TransactionRepository,
+            'fx_rates': FxRateRepository,
+            'rollups': RollupRepository,
+            'archive': TransactionArchiveRepository
+        }
+    )
+
+
+# ---------------- HELPERS ---------------- #
+
+@contextmanager
+def capture_statements(engine):
+    """
+    Collects (statement, parameters) of everything executed on the engine
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def parse_showplan(plan: str) -> list[tuple[str, bool]]:
+    accesses = []
+    for relop in ET.fromstring(plan).iter(f'{SHOWPLAN_NS}RelOp'):
+        table = relop.find(f'./*/{SHOWPLAN_NS}Object')
+        if table is not None and table.get('Table'):
+            accesses.append((table.get('Table').strip('[]'), relop.get('PhysicalOp') in MSSQL_SCANS))
+    return accesses
+
+
+def parse_query_plan(rows) -> list[tuple[str, bool]]:
+    # SQLite: "SCAN transactions" or "SEARCH transactions USING INDEX ix_... (account_id=?)"
+    accesses = []
+    for row in rows:
+        operation, _, rest = row[-1].partition(' ')
+        if operation in ('SCAN', 'SEARCH'):
+            accesses.append((rest.split(' ')[0], operation == 'SCAN'))
+    return accesses
+
+
+async def explain(engine, statement: str, parameters) -> list[tuple[str, bool]]:
+    """
+    (table, is scan) of every table access in the estimated plan of the statement
+    """
+    async with engine.connect() as conn:
+        if engine.dialect.name == 'mssql':
+            await conn.exec_driver_sql('SET SHOWPLAN_XML ON')
+            try:
+                result = await conn.exec_driver_sql(statement, parameters)
+                return parse_showplan(result.scalar())
+            finally:
+                await conn.exec_driver_sql('SET SHOWPLAN_XML OFF')
+        result = await conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return parse_query_plan(result.all())
+
+
+QUERIES = {
+    'listDTO': lambda uow: uow.transactions.listDTO(user_id=1),
+    'listDTO_page': lambda uow: uow.transactions.listDTO_page(user_id=1, cursor=encode_cursor(['2025-05-03', 10])),
+    'getDTO': lambda uow: uow.transactions.getDTO(user_id=1, account_id=1, transaction_id=1),
+    'list_balances': lambda uow: uow.accounts.list_balances(user_id=1),
+    'fx_rates_history': lambda uow: uow.fx_rates.history(['USD'], datetime.date(2025, 5, 1)),
+    'fx_rates_latest': lambda uow: uow.fx_rates.latest(['USD', 'EUR'], datetime.date(2025, 5, 1)),
+    'rollups_aggregate': lambda uow: uow.rollups.aggregate(user_id=1, group_by=['month']),
+    'delete_transaction': lambda uow: TransactionService(uow).delete_transaction(user_id=1, account_id=1, transaction_id=1),
+    'list_deleted_transactions': lambda uow: TransactionService(uow).list_deleted_transactions(user_id=1),
+    'archive_batch': lambda uow: uow.archive.archive_batch(deleted_before=datetime.datetime(2025, 6, 1)),
+}
+
+
+# ---------------- TESTS ---------------- #
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", list(QUERIES))
+async def test_no_scans_on_hot_tables(engine, uow, query):
+    with capture_statements(engine) as statements:
+        async with uow:
+            await QUERIES[query](uow)
+            # Changes are rolled back, only the statements matter
+
+    statements = [(s, p) for s, p in statements if s.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))]
+    assert statements
+    for statement, parameters in statements:
+        accesses = await explain(engine, statement, parameters)
+        assert accesses, statement
+        scans = sorted({table for table, is_scan in accesses if is_scan and table in HOT_TABLES})
+        assert not scans, f'{query} scans {scans}:\n{statement}'
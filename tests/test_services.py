@@ -1,5 +1,6 @@
 import os
 import asyncio
+import datetime
 import pytest
 import pytest_asyncio
 from dotenv import dotenv_values
@@ -7,24 +8,38 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.engine.url import URL
 from core.schemas import Filter
+from core.exceptions import InvalidCursor, FilterFieldNotAllowed
 from budget.models import *
 from budget.uow import UnitOfWork
-from budget.repositories import UserRepository, AccountRepository, TransactionRepository
-from budget.services import UserService, AccountService, TransactionService
+from budget.reference import reference_data
+from budget.archive import TransactionArchiver
+from budget.repositories import (
+    UserRepository,
+    AccountRepository,
+    TransactionRepository,
+    FxRateRepository,
+    RollupRepository,
+    TransactionArchiveRepository
+)
+from budget.services import UserService, AccountService, TransactionService, CurrencyService, RollupService
 from budget.schemas import (
     UserCreateSchema,
     AccountCreateSchema,
     AccountUpdateInputSchema,
     TransactionCreateInputSchema,
     TransactionPurchaseCreateInputSchema,
-    TransactionTransferCreateInputSchema
+    TransactionTransferCreateInputSchema,
+    TransactionBatchCreateInputSchema,
+    TransactionCreateSchema
 )
 from budget.exceptions import (
     UserNotFound, 
     UserAlreadyExists,
     AccountNotFound,
     AccountAlreadyExists,
-    TransactionNotFound
+    TransactionNotFound,
+    InvalidTransaction,
+    CurrencyRateNotFound
 )
 
 
@@ -71,6 +86,14 @@ async def prepare_database(engine):
         await conn.run_sync(Base.metadata.create_all)
 
 
+@pytest.fixture(autouse=True)
+def reset_reference_data():
+    # Reference data is cached per process, while every test recreates the database
+    reference_data.clear()
+    yield
+    reference_data.clear()
+
+
 @pytest_asyncio.fixture
 async def uow(session: AsyncSession):
     return UnitOfWork(
@@ -78,7 +101,10 @@ async def uow(session: AsyncSession):
         repositories={
             'users': UserRepository,
             'accounts': AccountRepository,
-            'transactions': TransactionRepository
+            'transactions': TransactionRepository,
+            'fx_rates': FxRateRepository,
+            'rollups': RollupRepository,
+            'archive': TransactionArchiveRepository
         }
     )
 
@@ -310,6 +336,37 @@ async def test_get_user_balance_fail(uow):
         assert balance == 0.
 
 
+@pytest.mark.asyncio
+async def test_get_user_balance_in_base_currency(uow, seed_user, seed_accounts):
+    async with uow:
+        service = CurrencyService(uow)
+        await service.store_rates(rate_date=datetime.date(2025, 5, 1), rates={'KZT': 1., 'USD': 400., 'EUR': 500.})
+        await service.store_rates(rate_date=datetime.date.today(), rates={'KZT': 1., 'USD': 500., 'EUR': 550.})
+        await uow.session.execute(text("UPDATE accounts SET balance = 100. WHERE id = 1"))
+        await uow.commit()
+
+        service = AccountService(uow)
+        # 100 USD + 10 EUR
+        assert await service.get_user_balance(user_id=1, base_currency='KZT') == 55500.
+        assert await service.get_user_balance(user_id=1, base_currency='usd') == 111.
+        with pytest.raises(CurrencyRateNotFound):
+            _ = await service.get_user_balance(user_id=1, base_currency='GBP')
+
+
+@pytest.mark.asyncio
+async def test_get_user_balance_uses_last_stored_rates(uow, seed_user, seed_accounts):
+    async with uow:
+        service = CurrencyService(uow)
+        await service.store_rates(rate_date=datetime.date(2025, 5, 1), rates={'KZT': 1., 'USD': 400., 'EUR': 500.})
+        await service.store_rates(rate_date=datetime.date(2025, 5, 2), rates={'KZT': 1., 'USD': 450., 'EUR': 520.})
+        await uow.session.execute(text("UPDATE accounts SET balance = 100. WHERE id = 1"))
+        await uow.commit()
+
+        # Rates of today are not stored yet, the ones of the last stored day are used
+        service = AccountService(uow)
+        assert await service.get_user_balance(user_id=1, base_currency='KZT') == 50200.
+
+
 @pytest.mark.asyncio
 async def test_find_currency(uow, seed_currency):
     async with uow:
@@ -382,6 +439,59 @@ async def test_list_transactions_with_filters(uow, seed_user, seed_accounts, see
         assert len(transactions) == 0
 
 
+@pytest.mark.asyncio
+async def test_list_transactions_filter_plan_cache(uow, seed_user, seed_accounts, seed_transaction_types, seed_transactions):
+    async with uow:
+        service = TransactionService(uow)
+        info_before = TransactionRepository.filter_cache_info()
+        for account_id, expected in [(1, 2), (2, 1), (3, 0)]:
+            filters = Filter.model_validate([{'field': 'account_id', 'op': '=', 'value': account_id}])
+            transactions = await service.list_transactions(user_id=1, filters=filters)
+            assert len(transactions) == expected
+        info_after = TransactionRepository.filter_cache_info()
+        assert info_after['hits'] - info_before['hits'] >= 2
+
+
+@pytest.mark.asyncio
+async def test_list_transactions_page(uow, seed_user, seed_accounts, seed_transaction_types, seed_transactions):
+    async with uow:
+        service = TransactionService(uow)
+        first_page = await service.list_transactions_page(user_id=1, limit=2)
+        assert [t.id for t in first_page.items] == [3, 2]
+        assert first_page.next_cursor is not None
+        # Rows inserted after the first page don't shift the next one
+        await uow.session.execute(text("""
+        INSERT INTO transactions(type_id, account_id, amount, currency, amount_in_account_currency, transaction_date, is_deleted)
+        VALUES (1, 1, 5., 'USD', 5., '2025-05-20', 0)
+        """))
+        second_page = await service.list_transactions_page(user_id=1, limit=2, cursor=first_page.next_cursor)
+        assert [t.id for t in second_page.items] == [1]
+        assert second_page.next_cursor is None
+        with pytest.raises(InvalidCursor):
+            _ = await service.list_transactions_page(user_id=1, cursor='not a cursor')
+
+
+@pytest.mark.asyncio
+async def test_list_accounts_page(uow, seed_user, seed_accounts):
+    async with uow:
+        service = AccountService(uow)
+        first_page = await service.list_accounts_page(user_id=1, limit=1)
+        assert [a.id for a in first_page.items] == [2]
+        second_page = await service.list_accounts_page(user_id=1, limit=1, cursor=first_page.next_cursor)
+        assert [a.id for a in second_page.items] == [1]
+        assert second_page.next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_stream_transactions(uow, seed_user, seed_accounts, seed_transaction_types, seed_transactions):
+    async with uow:
+        service = TransactionService(uow)
+        batches = [batch async for batch in service.stream_transactions(user_id=1, batch_size=2)]
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert [t.id for batch in batches for t in batch] == [3, 2, 1]
+        assert not any(isinstance(instance, Transaction) for instance in uow.session.identity_map.values())
+
+
 @pytest.mark.asyncio
 async def test_empty_list_transactions(uow, seed_user, seed_accounts):
     async with uow:
@@ -430,3 +540,168 @@ async def test_delete_transaction_fail(uow, seed_user, seed_accounts, seed_trans
         service = TransactionService(uow)
         with pytest.raises(TransactionNotFound):
             _ = await service.delete_transaction(user_id=1, account_id=1, transaction_id=1)
+
+
+@pytest.mark.asyncio
+async def test_delete_transaction_twice(uow, seed_user, seed_accounts, seed_transaction_types, seed_transactions):
+    async with uow:
+        service = TransactionService(uow)
+        await service.delete_transaction(user_id=1, account_id=1, transaction_id=1)
+        await uow.commit()
+        with pytest.raises(TransactionNotFound):
+            _ = await service.delete_transaction(user_id=1, account_id=1, transaction_id=1)
+        account = await AccountService(uow).get_account(account_id=1, user_id=1)
+        assert account.balance == -1000
+
+
+@pytest.mark.asyncio
+async def test_archive_deleted_transactions(uow, seed_user, seed_accounts, seed_transaction_types, seed_transactions):
+    async with uow:
+        service = TransactionService(uow)
+        transfer = await service.create_transfer(
+            transaction_data=TransactionTransferCreateInputSchema(
+                user_id=1, account_id=1, account_id_to=2, amount=100, currency='USD',
+                transaction_date='2025-05-01', amount_in_account_currency_to=90
+            )
+        )
+        await uow.commit()
+        await service.delete_transaction(user_id=1, account_id=1, transaction_id=transfer.id)
+        await service.delete_transaction(user_id=1, account_id=1, transaction_id=1)
+        await uow.commit()
+
+    # Batches of one row, the other leg of the transfer is moved along with its pair
+    assert await TransactionArchiver(uow, retention_days=0, batch_size=1, pause=0).archive() == 3
+    assert await TransactionArchiver(uow, retention_days=0, pause=0).archive() == 0
+
+    async with uow:
+        service = TransactionService(uow)
+        assert await uow.transactions.list_deletedDTO(user_id=1) == []
+        assert len(await service.list_transactions(user_id=1)) == 2
+        deleted = {transaction.id: transaction for transaction in await service.list_deleted_transactions(user_id=1)}
+        assert set(deleted) == {1, transfer.id, transfer.id + 1}
+        assert deleted[transfer.id].reference_transaction_id == transfer.id + 1
+        assert deleted[transfer.id + 1].reference_transaction_id == transfer.id
+        assert [t.id for t in await service.list_deleted_transactions(user_id=1, limit=1, offset=2)] == [transfer.id]
+
+
+@pytest.mark.asyncio
+async def test_create_many_transactions(uow, seed_user, seed_accounts, seed_transaction_types):
+    async with uow:
+        type_ = await uow.transactions.get_transaction_type(name='Topup')
+        account = await uow.accounts.get(id=1)
+        transactions = await uow.transactions.create_many([
+            TransactionCreateSchema(type=type_, account=account, amount=amount, currency='USD')
+            for amount in (10, 20, 30)
+        ])
+        await uow.commit()
+        assert [t.amount for t in transactions] == [10, 20, 30]
+        assert len({t.id for t in transactions}) == 3
+        assert await uow.transactions.create_many([]) == []
+
+
+@pytest.mark.asyncio
+async def test_create_transactions_batch(uow, seed_user, seed_accounts, seed_transaction_types):
+    async with uow:
+        service = TransactionService(uow)
+        transactions = await service.create_transactions_batch(
+            transaction_data=TransactionBatchCreateInputSchema(user_id=1, transactions=[
+                {'type': 'Purchase', 'account_id': 1, 'amount': 3, 'currency': 'USD', 'description': 'coffee', 'transaction_date': '2025-05-01'},
+                {'type': 'Purchase', 'account_id': 1, 'amount': 12, 'currency': 'USD', 'description': 'lunch', 'transaction_date': '2025-05-01'},
+                {'type': 'Topup', 'account_id': 2, 'amount': 10, 'currency': 'USD', 'amount_in_account_currency': 9, 'transaction_date': '2025-05-01'},
+                {'type': 'Purchase', 'account_id': 1, 'amount': 8, 'currency': 'USD', 'description': 'taxi', 'transaction_date': '2025-05-02'},
+            ])
+        )
+        await uow.commit()
+        assert [t.amount for t in transactions] == [-3, -12, 10, -8]
+        assert [t.type.type_name for t in transactions] == ['Purchase', 'Purchase', 'Topup', 'Purchase']
+        assert transactions[0].account.balance == -23
+        assert transactions[2].account.balance == 20
+
+        # Nothing is written if any entry is invalid
+        with pytest.raises(InvalidTransaction):
+            await service.create_transactions_batch(
+                transaction_data=TransactionBatchCreateInputSchema(user_id=1, transactions=[
+                    {'type': 'Purchase', 'account_id': 1, 'amount': 5, 'currency': 'USD'},
+                    {'type': 'Purchase', 'account_id': 2, 'amount': 5, 'currency': 'USD'},
+                ])
+            )
+        with pytest.raises(AccountNotFound):
+            await service.create_transactions_batch(
+                transaction_data=TransactionBatchCreateInputSchema(user_id=1, transactions=[
+                    {'type': 'Purchase', 'account_id': 3, 'amount': 5, 'currency': 'USD'},
+                ])
+            )
+        await uow.rollback()
+
+    async with uow:
+        assert len(await TransactionService(uow).list_transactions(user_id=1)) == 4
+        assert (await AccountService(uow).get_account(account_id=1, user_id=1)).balance == -23
+        assert await RollupService(uow).check() == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_topups_keep_balance(uow, seed_user, seed_accounts, seed_transaction_types):
+    async def topup():
+        async with uow:
+            service = TransactionService(uow)
+            await service.create_topup(
+                transaction_data=TransactionCreateInputSchema(user_id=1, account_id=1, amount=10, currency='USD')
+            )
+            await uow.commit()
+
+    await asyncio.gather(*[topup() for _ in range(20)])
+    async with uow:
+        account = await AccountService(uow).get_account(account_id=1, user_id=1)
+        assert account.balance == 200
+
+
+@pytest.mark.asyncio
+async def test_summarize_transactions(uow, seed_user, seed_accounts, seed_transaction_types, seed_transactions):
+    async with uow:
+        await uow.session.execute(text("UPDATE transactions SET description = 'Coffee to go' WHERE id = 2"))
+        # Seeded with plain SQL, so rollups are backfilled
+        await RollupService(uow).rebuild()
+        service = TransactionService(uow)
+        rows = await service.summarize_transactions(user_id=1, group_by=['account', 'month'])
+        assert rows == [
+            {'account_id': 1, 'account_name': 'test account 1', 'month': '2025-05-01', 'account_currency': 'USD', 'total': 1800., 'count': 2, 'average': 900.},
+            {'account_id': 2, 'account_name': 'test account 2', 'month': '2025-05-01', 'account_currency': 'EUR', 'total': 800., 'count': 1, 'average': 800.},
+        ]
+        rows = await service.summarize_transactions(
+            user_id=1,
+            group_by=['keyword', 'week'],
+            keywords=['coffee'],
+            filters=Filter.model_validate([{'field': 'account_id', 'op': '=', 'value': 1}])
+        )
+        assert [(row['keyword'], row['week'], row['total']) for row in rows] == [(None, '2025-04-28', 1000.), ('coffee', '2025-04-28', 800.)]
+        with pytest.raises(FilterFieldNotAllowed):
+            _ = await service.summarize_transactions(user_id=1, group_by=['description'])
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_transactions(uow, seed_user, seed_accounts, seed_transaction_types, seed_transactions):
+    async with uow:
+        rollups = RollupService(uow)
+        assert len(await rollups.check()) > 0
+        await rollups.rebuild()
+        assert await rollups.check() == []
+
+        service = TransactionService(uow)
+        await service.create_purchase(
+            transaction_data=TransactionPurchaseCreateInputSchema(user_id=1, account_id=1, amount=50, currency='USD', description='Lunch')
+        )
+        await service.create_transfer(
+            transaction_data=TransactionTransferCreateInputSchema(
+                user_id=1, account_id=1, account_id_to=2, amount=100, currency='USD',
+                transaction_date='2025-05-01', amount_in_account_currency_to=90
+            )
+        )
+        await service.delete_transaction(user_id=1, account_id=1, transaction_id=1)
+        await uow.commit()
+        assert await rollups.check() == []
+
+        ledger = await uow.transactions.aggregate(user_id=1, group_by=['type', 'account', 'month'])
+        assert await service.summarize_transactions(user_id=1, group_by=['type', 'account', 'month']) == ledger
+        filters = Filter.model_validate([{'field': 'transaction_date', 'op': '>=', 'value': '2025-05-01'}])
+        ledger = await uow.transactions.aggregate(user_id=1, group_by=['day'], filters=filters)
+        assert await service.summarize_transactions(user_id=1, group_by=['day'], filters=filters) == ledger
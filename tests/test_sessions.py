@@ -0,0 +1,94 @@
+import pytest
+from aiclient import sessions
+from aiclient.ai_client import Client
+from aiclient.sessions import SessionRegistry
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions.time, 'monotonic', clock)
+    return clock
+
+
+def new_client() -> Client:
+    return Client('prompt')
+
+
+def test_lru_eviction(clock):
+    registry = SessionRegistry(max_active=2, idle_ttl=60, max_dormant=10)
+    first = registry.get(1, new_client)
+    registry.get(2, new_client)
+    # 1 becomes the most recently used, so 2 is evicted
+    assert registry.get(1, new_client) is first
+    registry.get(3, new_client)
+    assert registry.peek(1) is first
+    assert registry.peek(2) is None
+    assert registry.stats == {'created': 3, 'evicted': 1, 'restored': 0, 'dropped': 0}
+
+
+def test_idle_ttl_eviction(clock):
+    registry = SessionRegistry(max_active=10, idle_ttl=60, max_dormant=10)
+    registry.get(1, new_client)
+    clock.now += 30
+    registry.get(2, new_client)
+    clock.now += 31
+    registry.evict_idle()
+    assert registry.peek(1) is None
+    assert registry.peek(2) is not None
+
+
+def test_dormant_overflow_is_dropped(clock):
+    registry = SessionRegistry(max_active=1, idle_ttl=60, max_dormant=1)
+    for key in (1, 2, 3):
+        registry.get(key, new_client)
+    assert registry.stats['dropped'] == 1
+    assert registry.report()['dormant'] == 1
+
+
+def test_dump_restore_round_trip(clock):
+    registry = SessionRegistry(max_active=1, idle_ttl=60, max_dormant=10)
+    client = registry.get(1, new_client)
+    client.add_message({"role": "user", "content": "Потратила 300 на кофе"})
+    client.add_message({"role": "assistant", "content": None, "tool_calls": [
+        {"id": "call_1", "type": "function", "function": {"name": "get_accounts", "arguments": "{}"}}
+    ]})
+    client.add_message({"role": "tool", "tool_call_id": "call_1", "content": "[]"})
+    client.add_message({"role": "assistant", "content": "Записала"})
+
+    registry.get(2, new_client)
+    assert registry.peek(1) is None
+
+    restored = registry.get(1, new_client)
+    assert restored is not client
+    # Tool calls and their payloads are not stored, the plain dialogue is
+    assert restored.messages == [
+        {"role": "system", "content": "prompt"},
+        {"role": "user", "content": "Потратила 300 на кофе"},
+        {"role": "assistant", "content": "Записала"}
+    ]
+    assert registry.stats['restored'] == 1
+
+
+@pytest.mark.asyncio
+async def test_session_in_use_is_not_evicted(clock):
+    registry = SessionRegistry(max_active=1, idle_ttl=60, max_dormant=10)
+    async with registry.session(1, new_client) as client:
+        clock.now += 120
+        registry.get(2, new_client)
+        registry.get(3, new_client)
+        registry.evict_idle()
+        assert registry.peek(1) is client
+        assert registry.report()['in_use'] == 1
+    # Once the turn is over the session is evicted as usual
+    registry.get(4, new_client)
+    assert registry.peek(1) is None
+    assert registry.report()['in_use'] == 0
@@ -0,0 +1,56 @@
+import pytest
+from core.schemas import Page
+from aiclient import tools
+
+
+class RecordingService:
+    calls = []
+
+    def __init__(self, uow) -> None:
+        ...
+
+    async def _list(self, **kwargs) -> list:
+        self.calls.append(('offset', kwargs))
+        return []
+
+    async def _page(self, **kwargs):
+        self.calls.append(('page', kwargs))
+        return Page(items=[], next_cursor='next')
+
+    list_accounts = list_transactions = _list
+    list_accounts_page = list_transactions_page = _page
+
+
+class FakeUnitOfWork:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def service(monkeypatch):
+    RecordingService.calls = []
+    monkeypatch.setattr(tools, 'uow', FakeUnitOfWork())
+    monkeypatch.setattr(tools, 'AccountService', RecordingService)
+    monkeypatch.setattr(tools, 'TransactionService', RecordingService)
+    return RecordingService
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("tool", [tools.list_accounts, tools.list_transactions])
+@pytest.mark.parametrize("arguments, mode, passed", [
+    ({}, 'page', {}),
+    # The first page asked with offset=0 still returns next_cursor
+    ({'offset': 0}, 'page', {}),
+    ({'cursor': 'abc'}, 'page', {'cursor': 'abc'}),
+    # The cursor wins over the offset
+    ({'offset': 20, 'cursor': 'abc'}, 'page', {'cursor': 'abc'}),
+    ({'offset': 20}, 'offset', {'offset': 20}),
+    ({'offset': 20, 'cursor': None}, 'offset', {'offset': 20}),
+])
+async def test_list_pagination_mode(service, tool, arguments, mode, passed):
+    result = await tool(user_id=1, limit=10, **arguments)
+    assert service.calls == [(mode, {'filters': None, 'user_id': 1, 'limit': 10, **passed})]
+    assert result == ([] if mode == 'offset' else {'items': [], 'next_cursor': 'next'})
@@ -1,4 +1,5 @@
 import os
+import datetime
 from dotenv import load_dotenv
 from telegram.ext import (
     ApplicationBuilder, 
@@ -7,21 +8,81 @@ from telegram.ext import (
     Application,
     filters
 )
-from tg_bot.handlers import start, ai_handler
+from tg_bot.handlers import start, stats, ai_handler
 from tg_bot.error_handler import error_handler
 from tg_bot.handlers.create_account import create_account_handler
 from tg_bot.messages import Messages
+from tg_bot.inbox import UserInbox
+from tg_bot.utils import ADMIN_CHAT_ID
+from aiclient import transport
+from aiclient.sessions import SessionRegistry
+from core.database import Session
+from budget.uow import UnitOfWork
+from budget.repositories import AccountRepository, TransactionRepository, FxRateRepository, TransactionArchiveRepository
+from budget.services import CurrencyService
+from budget.reference import reference_data
+from budget.fx import rate_provider
+from budget.archive import TransactionArchiver
 
 load_dotenv()
 
 
+uow = UnitOfWork(Session, repositories={
+    'accounts': AccountRepository,
+    'transactions': TransactionRepository,
+    'fx_rates': FxRateRepository,
+    'archive': TransactionArchiveRepository
+})
+
+transaction_archiver = TransactionArchiver(uow)
+
+
+# The provider refreshes rates every FX_RATES_TTL, the table keeps one set of rates per day
+fx_rates_stored_on: datetime.date | None = None
+
+
+async def store_fx_rates(rates: dict) -> None:
+    global fx_rates_stored_on
+    today = datetime.date.today()
+    if fx_rates_stored_on == today:
+        return
+    async with uow:
+        await CurrencyService(uow).store_rates(rate_date=today, rates=rates)
+        await uow.commit()
+    fx_rates_stored_on = today
+
+
+async def post_init(app: Application) -> None:
+    await transport.warm_up()
+    async with uow:
+        await reference_data.refresh(uow)
+    rate_provider.add_listener(store_fx_rates)
+    rate_provider.start()
+    transaction_archiver.start()
+
+
+async def post_shutdown(app: Application) -> None:
+    await transport.close()
+    await rate_provider.stop()
+    await transaction_archiver.stop()
+
+
 def build_app() -> Application:
-    app = ApplicationBuilder().token(os.getenv('TG_BOT_TOKEN')).build()
+    app = ApplicationBuilder() \
+        .token(os.getenv('TG_BOT_TOKEN')) \
+        .post_init(post_init) \
+        .post_shutdown(post_shutdown) \
+        .build()
     
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", stats, filters=filters.Chat(chat_id=ADMIN_CHAT_ID)))
     app.add_handler(create_account_handler)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, ai_handler))
+    # Updates are processed one by one, as ConversationHandler requires.
+    # AI turns are slow, so they run in the background and UserInbox keeps them sequential per user
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, ai_handler, block=False))
     app.add_error_handler(error_handler)
     app.bot_data['messages'] = Messages()
+    app.bot_data['ai_sessions'] = SessionRegistry()
+    app.bot_data['ai_inbox'] = UserInbox()
 
     return app
@@ -0,0 +1,248 @@
+# This module records simple expenses and incomes without calling the AI.
+# Messages like "Spent 25 on groceries" or "Потратила 300 тг на кофе с Kaspi" are parsed with rules
+# and recorded through TransactionService directly. Anything ambiguous falls through to the AI client.
+
+import re
+import time
+from typing import List, Literal
+from pydantic import BaseModel
+from telegram.ext import ContextTypes
+
+from core.uow import UnitOfWork
+from core.database import Session
+from budget.repositories import AccountRepository, TransactionRepository, RollupRepository
+from budget.services import AccountService, TransactionService
+from budget.schemas import (
+    AccountReadSchema,
+    UserReadSchema,
+    TransactionCreateInputSchema,
+    TransactionPurchaseCreateInputSchema,
+    TransactionReadSchema
+)
+from budget.exceptions import AccountNotFound
+from budget.currencies import CURRENCY_ALIASES
+from aiclient.confirmations import format_amount
+from . import logger
+
+
+uow = UnitOfWork(Session, repositories={
+    'accounts': AccountRepository,
+    'transactions': TransactionRepository,
+    'rollups': RollupRepository
+})
+
+
+PURCHASE_VERBS = r'spent|paid|bought|потратила?|потратили|оплатила?|оплатили|купила?|купили|заплатила?|заплатили'
+TOPUP_VERBS = r'received|got|earned|получила?|получили|заработала?|заработали'
+
+# Words that make a message ambiguous for the rules: dates, questions, corrections, several items
+AMBIGUOUS_WORDS = re.compile(
+    r'\b(yesterday|today|tomorrow|last|ago|week|month|and|вчера|позавчера|завтра|прошл\w*|недел\w*|месяц\w*|назад|и|не|нет|отмени\w*|удали\w*)\b|[?;]|\d{1,2}[./]\d{1,2}[./]\d{2,4}|\d{1,2}/\d{1,2}'
+)
+# An account is bound only after one of these, so "in Kaspi store" stays a part of the description
+ACCOUNT_PREPOSITIONS = {
+    'purchase': r'from|with|by|via|с|со|через',
+    'topup': r'to|into|on|на|в|через',
+}
+# Besides a currency, only these may follow the amount. Anything else is a unit or a quantity: "3 кг яблок", "2 пиццы"
+AMOUNT_FOLLOWERS = re.compile(r'^(?:(?:on|for|at|in|на|за|в|во)\b|[,.\-—:]|$)')
+# A payment to a person is a transfer the rules can't tell from a purchase: "paid 5000 to Ivan"
+RECIPIENT = re.compile(r'\bto\b')
+DESCRIPTION_PREPOSITIONS = re.compile(r'^(on|for|на|за)\s+|\s+(on|for|на|за)$')
+AMOUNT = re.compile(r'(?<![\w.,])(\d{1,3}(?:[  ]\d{3})+|\d+)(?:[.,](\d{1,2}))?(к|k)?(?![\w.,])')
+
+
+FAST_PATH_TEMPLATES = {
+    'fast_path_purchase': 'Записала покупку: {description} — {amount} {currency}, счет {account_name}. Баланс счета: {balance} {account_currency}',
+    'fast_path_topup': 'Записала пополнение: {description} — {amount} {currency}, счет {account_name}. Баланс счета: {balance} {account_currency}',
+}
+
+
+class ParsedTransaction(BaseModel):
+    kind: Literal['purchase', 'topup']
+    amount: float
+    currency: str | None = None
+    description: str
+    account_id: int
+
+
+def parse_transaction(text: str, accounts: List[AccountReadSchema]) -> ParsedTransaction | None:
+    """
+    Returns the parsed transaction only when every part of the message is unambiguous:
+    a known verb at the start, exactly one amount, a known currency (or none) and a single account
+    """
+    text = ' '.join(text.lower().replace('ё', 'е').split()).strip(' .!')
+    match = re.match(rf'^({PURCHASE_VERBS}|{TOPUP_VERBS})\s+(.+)$', text)
+    if not match or AMBIGUOUS_WORDS.search(text):
+        return None
+    verb, rest = match.groups()
+    kind = 'purchase' if re.fullmatch(PURCHASE_VERBS, verb) else 'topup'
+
+    # Account: explicitly mentioned by name, or the only active account of the user
+    active_accounts = [account for account in accounts if account.is_active]
+    mentioned = []
+    for account in active_accounts:
+        name = re.escape(' '.join(account.name.lower().replace('ё', 'е').split()))
+        account_match = re.search(rf'\b(?:{ACCOUNT_PREPOSITIONS[kind]})\s+(?:card\s+|карт\w*\s+|сч[её]т\w*\s+)?(?<!\w){name}(?!\w)', rest)
+        if account_match:
+            mentioned.append((account, account_match))
+    if len(mentioned) > 1:
+        return None
+    if mentioned:
+        account, account_match = mentioned[0]
+        rest = (rest[:account_match.start()] + ' ' + rest[account_match.end():]).strip()
+    elif len(active_accounts) == 1:
+        account = active_accounts[0]
+    else:
+        return None
+    if kind == 'purchase' and RECIPIENT.search(rest):
+        return None
+
+    amounts = list(AMOUNT.finditer(rest))
+    if len(amounts) != 1:
+        return None
+    amount_match = amounts[0]
+    integer, fraction, thousands = amount_match.groups()
+    amount = float(re.sub(r'\s', '', integer) + (f'.{fraction}' if fraction else ''))
+    if thousands:
+        amount *= 1000
+    if amount <= 0:
+        return None
+
+    # Currency must stand right next to the amount
+    before, after = rest[:amount_match.start()].rstrip(), rest[amount_match.end():].lstrip()
+    currency = None
+    after_word = re.match(r'^([^\s\d]+)', after)
+    before_word = re.search(r'([^\s\d]+)$', before)
+    if after_word and after_word.group(1) in CURRENCY_ALIASES:
+        currency = CURRENCY_ALIASES[after_word.group(1)]
+        after = after[after_word.end():]
+    elif before_word and before_word.group(1) in CURRENCY_ALIASES:
+        currency = CURRENCY_ALIASES[before_word.group(1)]
+        before = before[:before_word.start()]
+    if currency and currency != account.currency:
+        # Needs amount_in_account_currency which only the user can provide
+        return None
+    if not AMOUNT_FOLLOWERS.match(after.lstrip()):
+        return None
+
+    description = ' '.join(f'{before} {after}'.split()).strip(' ,.-—:')
+    description = DESCRIPTION_PREPOSITIONS.sub('', description).strip(' ,.-—:')
+    if not re.search(r'[a-zа-я]{2,}', description) or any(word in CURRENCY_ALIASES for word in description.split()):
+        return None
+    # A second verb changes the meaning: "got paid 5000" is a salary, not a topup described as "Paid"
+    if re.search(rf'\b({PURCHASE_VERBS}|{TOPUP_VERBS})\b', description):
+        return None
+
+    return ParsedTransaction(
+        kind=kind,
+        amount=amount,
+        currency=account.currency,
+        description=description[0].upper() + description[1:],
+        account_id=account.id
+    )
+
+
+class FastPathStats:
+    """
+    Hit rate of the fast path and latency it saves compared to an average AI turn
+    """
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.fast_path_seconds = 0.
+        self.ai_turns = 0
+        self.ai_seconds = 0.
+
+    def record_hit(self, elapsed: float) -> None:
+        self.hits += 1
+        self.fast_path_seconds += elapsed
+
+    def record_miss(self) -> None:
+        self.misses += 1
+
+    def record_ai_turn(self, elapsed: float) -> None:
+        self.ai_turns += 1
+        self.ai_seconds += elapsed
+
+    def report(self) -> dict:
+        total = self.hits + self.misses
+        avg_fast_path = self.fast_path_seconds / self.hits if self.hits else 0.
+        avg_ai = self.ai_seconds / self.ai_turns if self.ai_turns else 0.
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.,
+            'avg_fast_path_seconds': round(avg_fast_path, 4),
+            'avg_ai_turn_seconds': round(avg_ai, 4),
+            'saved_seconds': round(max(avg_ai - avg_fast_path, 0.) * self.hits, 2) if self.ai_turns else 0.
+        }
+
+
+fast_path_stats = FastPathStats()
+
+
+def render_reply(context: ContextTypes.DEFAULT_TYPE, parsed: ParsedTransaction, transaction: TransactionReadSchema) -> str:
+    code = f'fast_path_{parsed.kind}'
+    template = getattr(context.bot_data['messages'], code, FAST_PATH_TEMPLATES[code])
+    return template.format(
+        description=parsed.description,
+        amount=format_amount(abs(transaction.amount)),
+        currency=transaction.currency,
+        account_name=transaction.account.name,
+        balance=format_amount(transaction.account.balance),
+        account_currency=transaction.account.currency
+    )
+
+
+async def try_fast_path(context: ContextTypes.DEFAULT_TYPE, user: UserReadSchema, message: str) -> str | None:
+    """
+    Records the transaction and returns the reply, or returns None if the message must go to the AI
+    """
+    started = time.perf_counter()
+    if not re.match(rf'^\s*({PURCHASE_VERBS}|{TOPUP_VERBS})\b', message.lower()):
+        fast_path_stats.record_miss()
+        return None
+
+    async with uow:
+        accounts = await AccountService(uow).list_accounts(user_id=user.id, limit=50)
+        parsed = parse_transaction(message, accounts)
+        if parsed is None:
+            fast_path_stats.record_miss()
+            return None
+
+        service = TransactionService(uow)
+        try:
+            if parsed.kind == 'purchase':
+                transaction = await service.create_purchase(
+                    transaction_data=TransactionPurchaseCreateInputSchema(
+                        user_id=user.id,
+                        account_id=parsed.account_id,
+                        amount=parsed.amount,
+                        currency=parsed.currency,
+                        description=parsed.description
+                    )
+                )
+            else:
+                transaction = await service.create_topup(
+                    transaction_data=TransactionCreateInputSchema(
+                        user_id=user.id,
+                        account_id=parsed.account_id,
+                        amount=parsed.amount,
+                        currency=parsed.currency,
+                        description=parsed.description
+                    )
+                )
+            await uow.commit()
+        except AccountNotFound:
+            fast_path_stats.record_miss()
+            return None
+        except Exception as e:
+            # The AI path reports the problem to the user, the fast path must never lose the message
+            logger.error(f'Fast path failed, falling back to the AI: {e}')
+            fast_path_stats.record_miss()
+            return None
+
+    reply = render_reply(context, parsed, transaction)
+    fast_path_stats.record_hit(time.perf_counter() - started)
+    return reply
@@ -1,19 +1,23 @@
 # This package contains all handlers for telegram commands, messages and conversations
 
+import time
 import datetime
 from telegram import Update, constants
 from telegram.ext import ContextTypes
 
 from core.uow import UnitOfWork
 from core.database import Session
-from budget.schemas import UserCreateSchema
+from budget.schemas import UserCreateSchema, UserReadSchema
 from budget.repositories import UserRepository
 from budget.services import UserService
 from budget.exceptions import UserNotFound
-from aiclient.ai_client import Client
+from aiclient.ai_client import Client, prompt_cache_report
+from aiclient.sessions import SessionRegistry
 from aiclient.utils import load_user_prompt
 
 from ..error_handler import NoUserFoundException
+from ..fast_path import try_fast_path, fast_path_stats
+from ..inbox import UserInbox
 
 
 uow = UnitOfWork(Session, repositories={'users': UserRepository})
@@ -57,23 +61,74 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 
+def format_report(title: str, report: dict) -> str:
+    return '\n'.join([title] + [f'  {key}: {value}' for key, value in report.items()])
+
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    stats - admin only, in-memory counters of the bot process
+    """
+    ai_sessions: SessionRegistry = context.bot_data['ai_sessions']
+    ai_sessions.evict_idle()
+    sessions_report = ai_sessions.report()
+    # Per-session sizes don't fit into a message
+    sessions_report.pop('sessions')
+    await update.message.reply_text('\n\n'.join([
+        format_report('AI sessions:', sessions_report),
+        format_report('Prompt cache:', prompt_cache_report()),
+        format_report('Fast path:', fast_path_stats.report())
+    ]))
+
+
 async def ai_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     ai_handler - activates the openai client and handles all user's messages if the user is registered
     """
     await context.bot.send_chat_action(chat_id=update.effective_user.id, action=constants.ChatAction.TYPING)
     user = await get_user(context, update.effective_user.id)
-            
-    if not context.user_data.get('ai_client'):
+
+    inbox: UserInbox = context.bot_data['ai_inbox']
+    if not await inbox.collect(user.id, update.message.text):
+        # The message is merged into a later one of the same burst
+        return
+
+    async with inbox.turn(user.id):
+        message = inbox.drain(user.id)
+        if message is not None:
+            await context.bot.send_chat_action(chat_id=update.effective_user.id, action=constants.ChatAction.TYPING)
+            reply = await handle_ai_message(context, user, message)
+            await update.message.reply_text(reply)
+
+
+async def handle_ai_message(context: ContextTypes.DEFAULT_TYPE, user: UserReadSchema, message: str) -> str:
+    """
+    Runs one turn for the merged messages: the rule-based fast path first, then the user's AI session
+    """
+    def new_ai_client() -> Client:
         ai_context = {
             'user': user,
             'date': datetime.datetime.now().strftime('%Y-%m-%d')
         }
         prompt = load_user_prompt()
-        context.user_data['ai_client'] = Client(prompt, ai_context)
+        return Client(prompt, ai_context, templates=context.bot_data['messages'])
+
+    ai_sessions: SessionRegistry = context.bot_data['ai_sessions']
 
-    message = update.message.text
-    ai_client: Client = context.user_data.get('ai_client')
+    reply = await try_fast_path(context, user, message)
+    if reply is not None:
+        # Keep the AI conversation aware of the transaction recorded without it
+        ai_client = ai_sessions.peek(user.id)
+        if ai_client:
+            ai_client.add_message({"role": "user", "content": message})
+            ai_client.add_message({"role": "assistant", "content": reply})
+            ai_client.context['accounts'] = None
+        return reply
 
-    reply = await ai_client.chat(message)
-    await update.message.reply_text(reply)
+    async with ai_sessions.session(user.id, new_ai_client) as ai_client:
+        if ai_client.context.get('accounts') is None:
+            await ai_client.refresh_accounts()
+        started = time.perf_counter()
+        reply = await ai_client.chat(message)
+    fast_path_stats.record_ai_turn(time.perf_counter() - started)
+    return reply
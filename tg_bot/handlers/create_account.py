@@ -16,7 +16,7 @@ from pydantic import ValidationError
 from core.uow import UnitOfWork
 from core.database import Session
 from budget.schemas import AccountCreateSchema
-from budget.repositories import AccountRepository, TransactionRepository
+from budget.repositories import AccountRepository, TransactionRepository, RollupRepository
 from budget.services import AccountService
 from budget.exceptions import AccountAlreadyExists, CurrencyNotFound
 from . import get_user
@@ -24,7 +24,8 @@ from . import get_user
 
 uow = UnitOfWork(Session, repositories={
     'accounts': AccountRepository,
-    'transactions': TransactionRepository
+    'transactions': TransactionRepository,
+    'rollups': RollupRepository
 })
 
 
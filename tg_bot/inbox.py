@@ -0,0 +1,55 @@
+# This module coalesces messages a user sends in quick succession into one AI turn
+# and makes sure only one turn per user runs at a time.
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, List
+from aiclient.settings import DEBOUNCE_SECONDS
+
+
+class UserInbox:
+    def __init__(self, window: float = DEBOUNCE_SECONDS) -> None:
+        self.window = window
+        self._pending: Dict[Hashable, List[str]] = {}
+        self._last_seq: Dict[Hashable, int] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        # Handlers holding or waiting for the user's lock, the lock is dropped only when there are none
+        self._lock_users: Dict[Hashable, int] = {}
+
+    async def collect(self, key: Hashable, message: str) -> bool:
+        """
+        Adds the message to the user's inbox and waits for the debounce window.
+        Returns True only for the last message of a burst, its handler runs the turn for the whole burst.
+        """
+        self._pending.setdefault(key, []).append(message)
+        seq = self._last_seq[key] = self._last_seq.get(key, 0) + 1
+        await asyncio.sleep(self.window)
+        return self._last_seq.get(key) == seq
+
+    @asynccontextmanager
+    async def turn(self, key: Hashable) -> AsyncIterator[None]:
+        """
+        Runs the body under the user's lock, so turns of one user never overlap
+        """
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                # Forget idle users, a new burst creates everything again
+                del self._lock_users[key]
+                self._locks.pop(key, None)
+                if key not in self._pending:
+                    self._last_seq.pop(key, None)
+
+    def drain(self, key: Hashable) -> str | None:
+        """
+        Returns all collected messages merged into one, or None if another turn has already taken them
+        """
+        messages = self._pending.pop(key, None)
+        if not messages:
+            return None
+        return '\n'.join(messages)
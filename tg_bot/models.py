@@ -1,13 +1,13 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import BigInteger, String, Text
+from sqlalchemy import String, Text
 
 
-from core.database import Base
+from core.database import Base, BigIntegerPK
 
 
 class TgMessage(Base):
     __tablename__ = "tg_messages"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     code: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     message: Mapped[str] = mapped_column(Text, nullable=False)
@@ -2,6 +2,7 @@ import os
 from telegram import Bot
 
 
+ADMIN_CHAT_ID = int(os.getenv('TG_ADMIN_CHAT_ID', 793074650))
+
 async def notify_admin(msg: str) -> None:
-    recipient = 793074650
-    await Bot(os.getenv('TG_BOT_TOKEN')).sendMessage(chat_id=recipient, text=f"ALARM!\n{msg}")
+    await Bot(os.getenv('TG_BOT_TOKEN')).sendMessage(chat_id=ADMIN_CHAT_ID, text=f"ALARM!\n{msg}")